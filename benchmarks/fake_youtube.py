@@ -0,0 +1,230 @@
+"""A local stand-in for the YouTube Data API, for offline benchmarks.
+
+``FakeYouTubeHttp`` plays the part of the ``httplib2.Http`` object that
+``googleapiclient`` sends requests through. It serves a deterministic
+synthetic library for ``playlists``, ``playlistItems``, ``videos`` and
+``channels`` list calls with payloads shaped like the real ones, honours
+``fields`` masks and ``If-None-Match`` with ETags, and can add latency and
+random ``videos.list`` failures. ``payload_bytes`` tallies, per endpoint, the
+bytes each reply would have had without its mask, as sent, and gzipped. The
+client itself is built from the bundled discovery document, so the real
+request and response code paths are used.
+"""
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+import httplib2
+from googleapiclient.discovery import build
+
+from playlist_sorter.transport import WIRE_LENGTH_HEADER
+
+PLAYLIST_ID = 'PLbenchmark'
+CHANNEL_ID = 'UCbenchmark'
+
+_WORDS = (
+    'how to make the best ever guide why you should never try this in minutes '
+    'review live full album explained tutorial python cooking travel vlog music '
+    'news history science game walkthrough part finale episode trailer reaction'
+).split()
+
+
+def _parse_fields(mask):
+    """Parses a ``fields`` mask such as ``a,b/c,d(e,f/g)`` into nested dicts."""
+    def parse(pos):
+        tree = {}
+        while pos < len(mask):
+            end = pos
+            while end < len(mask) and mask[end] not in ',()':
+                end += 1
+            node = tree
+            keys = mask[pos:end].split('/')
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            leaf = node.setdefault(keys[-1], {})
+            if end < len(mask) and mask[end] == '(':
+                sub, end = parse(end + 1)
+                leaf.update(sub)
+                end += 1  # the closing parenthesis
+            if end < len(mask) and mask[end] == ')':
+                return tree, end
+            pos = end + 1
+        return tree, pos
+    return parse(0)[0]
+
+
+def _apply_fields(value, tree):
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_apply_fields(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: _apply_fields(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+
+class FakeYouTubeHttp:
+    """Serves a synthetic ``n_videos`` playlist; thread-safe and deterministic."""
+
+    def __init__(self, n_videos, latency=0.0, error_rate=0.0, seed=0):
+        self.n_videos = n_videos
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.request_seconds = []
+        # endpoint -> bytes without the fields mask, as sent, and as gzip would send them
+        self.payload_bytes = {}
+
+    # --- Synthetic data ---
+
+    def video_id(self, i):
+        return f'v{i:010d}'
+
+    def _thumbnails(self, video_id):
+        return {
+            size: {'url': f'https://i.ytimg.com/vi/{video_id}/{name}.jpg', 'width': w, 'height': h}
+            for size, name, w, h in (('default', 'default', 120, 90), ('medium', 'mqdefault', 320, 180),
+                                     ('high', 'hqdefault', 480, 360), ('standard', 'sddefault', 640, 480),
+                                     ('maxres', 'maxresdefault', 1280, 720))
+        }
+
+    def video_item(self, i, parts):
+        rng = random.Random(self.seed * 1_000_003 + i)
+        item = {'kind': 'youtube#video', 'etag': f'e{i}', 'id': self.video_id(i)}
+        if 'snippet' in parts:
+            title = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(3, 10))).title()
+            description = 'lorem ipsum ' * rng.randint(5, 60)
+            channel = rng.randint(0, max(1, self.n_videos // 20))
+            item['snippet'] = {
+                'publishedAt': '2024-01-01T00:00:00Z',
+                'channelId': f'UC{channel:022d}',
+                'title': title,
+                'description': description,
+                'thumbnails': self._thumbnails(self.video_id(i)),
+                'channelTitle': f'Channel {channel}',
+                'tags': [rng.choice(_WORDS) for _ in range(rng.randint(0, 12))],
+                'categoryId': '22',
+                'liveBroadcastContent': 'none',
+                'localized': {'title': title, 'description': description},
+            }
+        if 'contentDetails' in parts:
+            seconds = int(rng.lognormvariate(6.3, 1.0))
+            h, rem = divmod(seconds, 3600)
+            m, s = divmod(rem, 60)
+            duration = 'P0D' if rng.random() < 0.002 else f"PT{f'{h}H' if h else ''}{f'{m}M' if m else ''}{s}S"
+            item['contentDetails'] = {'duration': duration, 'dimension': '2d', 'definition': 'hd',
+                                      'caption': 'false', 'licensedContent': True,
+                                      'contentRating': {}, 'projection': 'rectangular'}
+        if 'statistics' in parts:
+            item['statistics'] = {'viewCount': str(int(rng.paretovariate(1.2) * 1000)),
+                                  'likeCount': str(rng.randint(0, 10**5)), 'favoriteCount': '0',
+                                  'commentCount': str(rng.randint(0, 10**4))}
+        if 'status' in parts:
+            item['status'] = {'uploadStatus': 'processed', 'privacyStatus': 'public',
+                              'license': 'youtube', 'embeddable': True,
+                              'publicStatsViewable': True, 'madeForKids': False}
+        return item
+
+    # --- Endpoints ---
+
+    def _playlists(self, query):
+        return {'items': [{'kind': 'youtube#playlist', 'id': query.get('id', PLAYLIST_ID),
+                           'snippet': {'title': 'Benchmark playlist'},
+                           'contentDetails': {'itemCount': self.n_videos}}]}
+
+    def _channels(self, query):
+        return {'items': [{'kind': 'youtube#channel', 'id': CHANNEL_ID}]}
+
+    def _playlist_items(self, query):
+        parts = query.get('part', '').split(',')
+        start = int(query.get('pageToken') or 0)
+        stop = min(start + int(query.get('maxResults', 5)), self.n_videos)
+        items = []
+        for i in range(start, stop):
+            item = {'kind': 'youtube#playlistItem', 'etag': f'p{i}', 'id': f'item{i:012d}'}
+            if 'snippet' in parts:
+                item['snippet'] = {
+                    'publishedAt': '2024-01-01T00:00:00Z', 'channelId': 'UCowner',
+                    'title': f'Video {i}', 'description': 'lorem ipsum ' * 10,
+                    'thumbnails': self._thumbnails(self.video_id(i)),
+                    'channelTitle': 'Owner', 'playlistId': query.get('playlistId'), 'position': i,
+                    'resourceId': {'kind': 'youtube#video', 'videoId': self.video_id(i)},
+                }
+            if 'contentDetails' in parts:
+                item['contentDetails'] = {'videoId': self.video_id(i),
+                                          'videoPublishedAt': '2024-01-01T00:00:00Z'}
+            items.append(item)
+        body = {
+            'kind': 'youtube#playlistItemListResponse',
+            'pageInfo': {'totalResults': self.n_videos, 'resultsPerPage': stop - start},
+            'items': items,
+        }
+        if stop < self.n_videos:
+            body['nextPageToken'] = str(stop)
+        return body
+
+    def _videos(self, query):
+        parts = query.get('part', '').split(',')
+        ids = [vid for vid in query.get('id', '').split(',') if vid]
+        return {'items': [self.video_item(int(vid[1:]), parts) for vid in ids
+                          if vid[1:].isdigit() and int(vid[1:]) < self.n_videos]}
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        start = time.perf_counter()
+        parsed = urllib.parse.urlparse(uri)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        if body and method == 'POST':
+            # googleapiclient turns very long GETs into POSTs with a form body.
+            query.update(urllib.parse.parse_qsl(body if isinstance(body, str) else body.decode()))
+        endpoint = parsed.path.rsplit('/', 1)[-1]
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            fail = endpoint == 'videos' and self._rng.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+
+        if fail:
+            status, content = 503, json.dumps({'error': {'code': 503, 'message': 'Backend Error'}}).encode()
+        else:
+            handler = {'playlists': self._playlists, 'playlistItems': self._playlist_items,
+                       'videos': self._videos, 'channels': self._channels}.get(endpoint)
+            data = handler(query) if handler else {'items': []}
+            content = json.dumps(data, sort_keys=True).encode()
+            data['etag'] = hashlib.md5(content).hexdigest()
+            if headers.get('if-none-match') == data['etag']:
+                status, content = 304, b''
+            else:
+                status = 200
+                untrimmed = json.dumps(data).encode()
+                if query.get('fields'):
+                    data = _apply_fields(data, _parse_fields(query['fields']))
+                content = json.dumps(data).encode()
+                with self._lock:
+                    sizes = self.payload_bytes.setdefault(endpoint, dict.fromkeys(('untrimmed', 'sent', 'wire'), 0))
+                    sizes['untrimmed'] += len(untrimmed)
+                    sizes['sent'] += len(content)
+                    sizes['wire'] += len(gzip.compress(content, 6))
+
+        with self._lock:
+            self.request_seconds.append(time.perf_counter() - start)
+        response = httplib2.Response({'status': status, 'content-type': 'application/json'})
+        # What a gzip-encoded reply would have put on the wire, as ``transport.PooledHttp`` reports.
+        response[WIRE_LENGTH_HEADER] = str(len(gzip.compress(content, 6)))
+        return response, content
+
+    def close(self):
+        pass
+
+
+def build_fake_client(http):
+    """Builds a real ``youtube`` v3 client that talks to ``http``."""
+    return build('youtube', 'v3', http=http, developerKey='benchmark', static_discovery=True)
@@ -0,0 +1,235 @@
+"""Offline benchmarks for fetching, sorting, searching and paging.
+
+Runs against ``FakeYouTubeHttp``, so no Google account or quota is needed:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1000 10000 --latency 0.05 --error-rate 0.01
+    python -m benchmarks.run --output after.json --compare before.json
+
+Results are written as JSON tagged with the current git commit, so runs of
+different commits can be compared with ``--compare``.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from playlist_sorter.budget import TimeBudget
+from playlist_sorter.cache import VideoCache
+from playlist_sorter.fetch import fetch_playlist_videos
+from playlist_sorter.frames import build_frame
+from playlist_sorter.metrics import Metrics
+from playlist_sorter.search import TitleIndex
+from playlist_sorter.sorting import SORT_COLUMNS, SortedViews
+from playlist_sorter.sync import SnapshotStore, sync_playlist
+
+from .fake_youtube import CHANNEL_ID, PLAYLIST_ID, FakeYouTubeHttp, build_fake_client
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def _latency_summary(seconds):
+    if not seconds:
+        return {'count': 0}
+    ms = np.asarray(seconds) * 1000
+    return {
+        'count': len(ms),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _fetch(http, concurrency, cache=None):
+    """One full playlist fetch; returns the videos and a result row."""
+    youtube = build_fake_client(http)
+    metrics = Metrics()
+    errors = []
+    http.request_seconds.clear()
+    http.calls.clear()
+    http.payload_bytes.clear()
+    videos, seconds = _timed(
+        fetch_playlist_videos, youtube, PLAYLIST_ID, cache=cache,
+        http_factory=lambda: http, concurrency=concurrency,
+        on_error=errors.append, metrics=metrics,
+    )
+    row = {
+        'seconds': seconds,
+        'videos': len(videos),
+        'videos_per_sec': len(videos) / seconds if seconds else None,
+        'calls': dict(http.calls),
+        'errors': len(errors),
+        'api': _latency_summary(http.request_seconds),
+        # Response bytes per endpoint: without the fields masks, as sent, gzipped.
+        'payload_kb': {
+            endpoint: {kind: size / 1024 for kind, size in sizes.items()}
+            for endpoint, sizes in http.payload_bytes.items()
+        },
+    }
+    return videos, row
+
+
+def bench_size(n, latency, error_rate, concurrency, n_queries, n_flips, seed):
+    rng = random.Random(seed)
+    http = FakeYouTubeHttp(n, latency=latency, error_rate=error_rate, seed=seed)
+    result = {}
+
+    videos, result['fetch_cold'] = _fetch(http, concurrency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = VideoCache(f'{tmp}/videos.sqlite3')
+        _fetch(http, concurrency, cache)
+        _, result['fetch_warm_cache'] = _fetch(http, concurrency, cache)
+
+        store = SnapshotStore(f'{tmp}/snapshots.sqlite3')
+        youtube = build_fake_client(http)
+        sync_playlist(youtube, PLAYLIST_ID, store, CHANNEL_ID, cache=cache,
+                      http_factory=lambda: http, concurrency=concurrency)
+        http.calls.clear()
+        _, seconds = _timed(sync_playlist, youtube, PLAYLIST_ID, store, CHANNEL_ID, cache=cache,
+                            http_factory=lambda: http, concurrency=concurrency)
+        result['sync_unchanged'] = {'seconds': seconds, 'calls': dict(http.calls)}
+
+    df, seconds = _timed(build_frame, videos)
+    result['build_frame'] = {'seconds': seconds}
+    index, seconds = _timed(TitleIndex.from_frame, df)
+    result['build_search_index'] = {'seconds': seconds}
+    views, seconds = _timed(SortedViews, df)
+    result['build_sort_views'] = {'seconds': seconds}
+
+    # Searches: distinct substrings of real titles, so none hit the memo.
+    titles = df['title'].tolist()
+    queries = set()
+    while len(queries) < n_queries and titles:
+        title = rng.choice(titles)
+        length = rng.randint(2, 8)
+        start = rng.randint(0, max(0, len(title) - length))
+        queries.add(title[start:start + length])
+    latencies = [_timed(index.search, q)[1] for q in queries]
+    result['search'] = _latency_summary(latencies)
+
+    # Page flips over random sorts and duration ranges, 20 videos per page.
+    page_size = 20
+    latencies = []
+    for _ in range(n_flips):
+        key = rng.choice(list(SORT_COLUMNS))
+        ascending = rng.random() < 0.5
+        min_sec = rng.choice([None, 300])
+        max_sec = rng.choice([None, 900])
+        start = time.perf_counter()
+        order = views.select(key, ascending, None, min_sec, max_sec)
+        pages = max(1, (len(order) - 1) // page_size + 1)
+        page = rng.randrange(pages)
+        df.iloc[order[page * page_size:(page + 1) * page_size]]
+        latencies.append(time.perf_counter() - start)
+    result['paginate'] = _latency_summary(latencies)
+
+    # "Fill my next N minutes": count, best set by views and in playlist order.
+    budget, seconds = _timed(TimeBudget, df)
+    result['build_time_budget'] = {'seconds': seconds}
+    latencies = []
+    for _ in range(n_queries):
+        minutes = rng.choice([5, 15, 30, 60, 120, 600])
+        start = time.perf_counter()
+        budget.fit(minutes * 60)
+        budget.best_set(minutes * 60, rng.choice(['views', 'position']))
+        latencies.append(time.perf_counter() - start)
+    result['time_budget'] = _latency_summary(latencies)
+
+    # Memory held by the in-session structures for this library.
+    tracemalloc.start()
+    frame = build_frame(videos)
+    TitleIndex.from_frame(frame)
+    SortedViews(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result['peak_memory_mb'] = peak / 2**20
+
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, sub in value.items():
+            _flatten(f'{prefix}.{key}' if prefix else str(key), sub, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(old, new):
+    """Prints every numeric metric of ``new`` next to ``old``."""
+    before = _flatten('', old['results'], {})
+    after = _flatten('', new['results'], {})
+    print(f"\nComparing {old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for key, value in after.items():
+        if key in before and before[key]:
+            change = (value - before[key]) / before[key] * 100
+            print(f'  {key:<45} {before[key]:>12.4g} -> {value:>12.4g}  ({change:+.1f}%)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every API call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of videos.list calls that fail')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--flips', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON results here')
+    parser.add_argument('--compare', help='earlier JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'args': vars(args),
+        },
+        'results': {},
+    }
+    for n in args.sizes:
+        print(f'Benchmarking {n} videos...', file=sys.stderr)
+        report['results'][str(n)] = bench_size(
+            n, args.latency, args.error_rate, args.concurrency, args.queries, args.flips, args.seed
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
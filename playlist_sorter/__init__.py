@@ -0,0 +1 @@
+"""Streamlit-free helpers used by the Watch Later Sorter app."""
@@ -0,0 +1,126 @@
+"""Time-budget queries: which videos fit in the next N minutes.
+
+A ``TimeBudget`` is built once per videos frame: durations sorted ascending
+with their prefix sums, plus the candidates in each ranking's order. Then
+
+* videos up to X minutes long are a binary search over the sorted durations;
+* how many videos fit in a budget is a binary search over the prefix sums
+  (watching the shortest first fits the most);
+* the best set within a budget is a 0/1 knapsack over the best-ranked
+  videos that fit at all, bounded in candidates and in capacity cells so it
+  stays interactive on large libraries.
+
+Only videos with a known, positive duration take part. Answers are row
+positions into the frame, like ``SortedViews.select``.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# Ranking -> frame column and whether larger values rank first.
+RANKINGS = {
+    'views': ('view_count', True),
+    'position': ('position', False),
+}
+
+# Knapsack bounds: at most this many candidates, and the budget split into at
+# most this many cells (durations are rounded up to whole cells, so a chosen
+# set never runs over the budget).
+MAX_CANDIDATES = 400
+MAX_CELLS = 2000
+
+Fit = namedtuple('Fit', 'count seconds')
+BestSet = namedtuple('BestSet', 'positions seconds value')
+
+
+class TimeBudget:
+    """Sorted durations, prefix sums and ranked candidates for one videos frame."""
+
+    def __init__(self, df):
+        seconds = df['duration_sec'].to_numpy(dtype=np.float64, na_value=np.nan)
+        rows = np.flatnonzero(seconds > 0)
+        durations = seconds[rows].astype(np.int64)
+
+        order = np.argsort(durations, kind='stable')
+        self._rows = rows[order].astype(np.int32)
+        self._durations = durations[order]
+        self._prefix = np.concatenate([[0], np.cumsum(self._durations)])
+
+        # Per ranking: row positions, durations and values, best first.
+        self._ranked = {}
+        for rank, (column, descending) in RANKINGS.items():
+            values = df[column].to_numpy()[rows].astype(np.int64)
+            by_rank = np.argsort(-values if descending else values, kind='stable')
+            self._ranked[rank] = (rows[by_rank].astype(np.int32), durations[by_rank], values[by_rank])
+
+    @property
+    def nbytes(self):
+        """Approximate footprint, for memory budgets."""
+        arrays = [self._rows, self._durations, self._prefix]
+        arrays += [arr for ranked in self._ranked.values() for arr in ranked]
+        return sum(arr.nbytes for arr in arrays)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def at_most(self, max_sec):
+        """Returns row positions of videos no longer than ``max_sec``, shortest first."""
+        return self._rows[:np.searchsorted(self._durations, max_sec, side='right')]
+
+    def fit(self, budget_sec):
+        """Returns the most videos that fit in ``budget_sec`` and how long they take together."""
+        count = int(np.searchsorted(self._prefix, budget_sec, side='right')) - 1
+        return Fit(count, int(self._prefix[count]))
+
+    def best_set(self, budget_sec, rank='views'):
+        """
+        Returns the ``BestSet`` of videos totalling at most ``budget_sec``, in
+        ranking order. 'views' maximizes their total views; 'position' keeps
+        to playlist order, taking every next video that still fits, so an
+        earlier video is never given up for later ones.
+        """
+        rows, durations, values = self._ranked[rank]
+        fits = durations <= budget_sec
+        rows, durations, values = rows[fits], durations[fits], values[fits]
+
+        if rank == 'position':
+            chosen, left = [], budget_sec
+            shortest = self._durations[0] if len(self._durations) else 0
+            for i, duration in enumerate(durations.tolist()):
+                if left < shortest:
+                    break
+                if duration <= left:
+                    chosen.append(i)
+                    left -= duration
+            picked = np.array(chosen, dtype=np.intp)
+        else:
+            picked = _knapsack(durations[:MAX_CANDIDATES], values[:MAX_CANDIDATES], budget_sec)
+
+        return BestSet(rows[picked], int(durations[picked].sum()), int(values[picked].sum()))
+
+
+def _knapsack(durations, values, budget_sec):
+    """Returns indices of the 0/1 knapsack choice of greatest total value, in input order."""
+    if not len(durations):
+        return np.array([], dtype=np.intp)
+    cell = max(1, -(-int(budget_sec) // MAX_CELLS))
+    capacity = int(budget_sec) // cell
+    weights = -(-durations // cell)
+
+    best = np.zeros(capacity + 1, dtype=np.int64)
+    taken = np.zeros((len(weights), capacity + 1), dtype=bool)
+    for i, (weight, value) in enumerate(zip(weights.tolist(), values.tolist())):
+        if weight > capacity:
+            continue
+        # Computed from the previous row before anything is overwritten: 0/1, not unbounded.
+        with_item = best[:capacity + 1 - weight] + value
+        better = with_item > best[weight:]
+        taken[i, weight:] = better
+        best[weight:][better] = with_item[better]
+
+    chosen, left = [], capacity
+    for i in range(len(weights) - 1, -1, -1):
+        if taken[i, left]:
+            chosen.append(i)
+            left -= int(weights[i])
+    return np.array(chosen[::-1], dtype=np.intp)
@@ -0,0 +1,198 @@
+"""Persistent SQLite cache of video details, keyed by video ID.
+
+Each group of fields carries its own fetch timestamp so that slow-moving data
+(durations, titles) can be kept much longer than view counts. The table is
+capped at ``max_entries`` rows and evicts the least recently read videos.
+The app shares one cache between all users, so callers only store public and
+unlisted videos in it.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from .durations import DURATION_OK
+
+# How long each field group stays fresh, in seconds. None means forever.
+DEFAULT_TTLS = {
+    'contentDetails': None,          # durations never change once published
+    'snippet': 7 * 24 * 3600,        # titles, channels and thumbnails rarely do
+    'statistics': 6 * 3600,          # view counts move constantly
+}
+# Live streams and premieres get their real duration once they end, so a
+# duration that was not ok is fetched again after this long, TTLs or not.
+UNKNOWN_DURATION_TTL = 3600
+
+DEFAULT_PATH = os.path.join('.cache', 'video_details.sqlite3')
+DEFAULT_MAX_ENTRIES = 200_000
+
+# The API part that provides each cached column.
+PART_COLUMNS = {
+    'snippet': ('title', 'channel', 'thumbnail'),
+    'contentDetails': ('duration_sec', 'duration_status'),
+    'statistics': ('view_count',),
+}
+ALL_PARTS = tuple(PART_COLUMNS)
+
+# Stay well under SQLite's bound-parameter limit.
+_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    channel TEXT,
+    thumbnail TEXT,
+    duration_sec INTEGER,
+    duration_status TEXT,
+    view_count INTEGER,
+    snippet_at REAL,
+    contentDetails_at REAL,
+    statistics_at REAL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS videos_accessed_at ON videos (accessed_at);
+"""
+
+
+class VideoCache:
+    """Thread-safe, size-capped store of video records with per-part TTLs."""
+
+    def __init__(self, path=DEFAULT_PATH, ttls=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_entries = max_entries
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(videos)')}
+        if 'duration_status' not in columns:
+            # Older rows stored live and malformed durations as 0; re-fetch them.
+            self._conn.execute('ALTER TABLE videos ADD COLUMN duration_status TEXT')
+            self._conn.execute('UPDATE videos SET contentDetails_at = NULL')
+            self._conn.commit()
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] < 1:
+            # Earlier versions cached every video the signed-in user could see,
+            # private ones included; only public and unlisted ones are shared now.
+            self._conn.execute('DELETE FROM videos')
+            self._conn.execute('PRAGMA user_version = 1')
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM videos').fetchone()[0]
+
+    def _stale_parts(self, row, now, expire=True):
+        stale = []
+        for part in ALL_PARTS:
+            fetched_at = row[f'{part}_at']
+            ttl = self.ttls.get(part) if expire else None
+            if part == 'contentDetails' and row['duration_status'] != DURATION_OK:
+                ttl = UNKNOWN_DURATION_TTL if ttl is None else min(ttl, UNKNOWN_DURATION_TTL)
+            if fetched_at is None or (ttl is not None and now - fetched_at > ttl):
+                stale.append(part)
+        return tuple(stale)
+
+    def get_many(self, video_ids, now=None, stale_ok=()):
+        """
+        Looks up ``video_ids`` and reports what still has to be fetched.
+
+        Returns ``(records, refresh)``. ``records`` maps every cached ID to its
+        record, fresh or not. ``refresh`` maps each ID that needs an API call to
+        the tuple of parts to request; unknown IDs need every part. Parts of
+        the IDs in ``stale_ok`` are served whatever their age; only parts never
+        fetched, and durations that were not known, are requested for them.
+        """
+        now = time.time() if now is None else now
+        stale_ok = set(stale_ok)
+        records, refresh = {}, {}
+        ids = list(dict.fromkeys(video_ids))
+
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            try:
+                for i in range(0, len(ids), _CHUNK):
+                    chunk = ids[i:i + _CHUNK]
+                    marks = ','.join('?' * len(chunk))
+                    rows = self._conn.execute(
+                        f'SELECT * FROM videos WHERE id IN ({marks})', chunk
+                    ).fetchall()
+                    for row in rows:
+                        records[row['id']] = {
+                            'id': row['id'],
+                            'title': row['title'],
+                            'thumbnail': row['thumbnail'],
+                            'channel': row['channel'],
+                            'duration_sec': row['duration_sec'],
+                            'duration_status': row['duration_status'],
+                            'view_count': row['view_count'],
+                            # When its view count was fetched; see ``frames.details_fetched_at``.
+                            'fetched_at': row['statistics_at'],
+                        }
+                        stale = self._stale_parts(row, now, row['id'] not in stale_ok)
+                        if stale:
+                            refresh[row['id']] = stale
+            finally:
+                self._conn.row_factory = None
+
+            # Bump recency for everything we served so LRU eviction spares it.
+            self._conn.executemany(
+                'UPDATE videos SET accessed_at = ? WHERE id = ?',
+                [(now, vid) for vid in records],
+            )
+            self._conn.commit()
+
+        for vid in ids:
+            if vid not in records:
+                refresh[vid] = ALL_PARTS
+        return records, refresh
+
+    def put_many(self, records, parts=ALL_PARTS, now=None):
+        """Stores ``records``, stamping only the given ``parts`` as fresh."""
+        now = time.time() if now is None else now
+        if not records:
+            return
+
+        columns = ['id']
+        for part in parts:
+            columns.extend(PART_COLUMNS[part])
+        stamps = [f'{part}_at' for part in parts]
+
+        names = columns + stamps + ['accessed_at']
+        updates = ', '.join(f'{name} = excluded.{name}' for name in names[1:])
+        sql = (
+            f'INSERT INTO videos ({", ".join(names)}) '
+            f'VALUES ({", ".join("?" * len(names))}) '
+            f'ON CONFLICT(id) DO UPDATE SET {updates}'
+        )
+        rows = [
+            [rec[col] for col in columns] + [now] * len(stamps) + [now]
+            for rec in records
+        ]
+
+        with self._lock:
+            self._conn.executemany(sql, rows)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute('SELECT COUNT(*) FROM videos').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                'DELETE FROM videos WHERE id IN '
+                '(SELECT id FROM videos ORDER BY accessed_at LIMIT ?)',
+                (excess,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM videos')
+            self._conn.commit()
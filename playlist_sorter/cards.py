@@ -0,0 +1,112 @@
+"""HTML for the app's video cards.
+
+Card markup is memoized here rather than in the app script: Streamlit
+re-executes the script on every rerun, which would start a fresh cache each
+time, while an imported module (and its cache) lives as long as the server,
+so every session's page flips share it.
+"""
+import functools
+import html
+
+from .durations import format_duration
+from .frames import thumbnail_url
+
+# Rendered cards kept for page flips, across reruns and sessions.
+CARD_CACHE_SIZE = 20_000
+
+
+def player_html(row):
+    """Full YouTube embed; ``enablejsapi=1`` and ``origin`` are key for tracking."""
+    video_url = f"https://www.youtube.com/embed/{row['id']}?enablejsapi=1&origin=http://localhost:8501"
+    return f"""
+                <iframe
+                    width="100%"
+                    height="200"
+                    src="{video_url}"
+                    title="YouTube video player"
+                    frameborder="0"
+                    loading="lazy"
+                    allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share"
+                    allowfullscreen
+                    style="border-radius: 10px 10px 0 0;">
+                </iframe>"""
+
+
+def facade_html(row):
+    """
+    Thumbnail stand-in for the player. It is a tiny ``srcdoc`` page showing
+    the already-fetched thumbnail and duration; clicking it navigates the frame
+    to the same ``enablejsapi`` embed (autoplaying), so no player boots until
+    asked.
+    """
+    video_url = f"https://www.youtube.com/embed/{row['id']}?autoplay=1&enablejsapi=1&origin=http://localhost:8501"
+    thumbnail = thumbnail_url(row['id'])
+    doc = f"""<style>
+        *{{margin:0;padding:0;overflow:hidden}}
+        html,body,a{{display:block;height:100%;background:#000}}
+        img{{width:100%;height:100%;object-fit:cover}}
+        .play{{position:absolute;inset:0;margin:auto;width:68px;height:48px;border-radius:12px;
+               background:rgba(255,0,0,.85);color:#fff;font:28px/48px sans-serif;text-align:center}}
+        .badge{{position:absolute;right:8px;bottom:8px;padding:2px 6px;border-radius:4px;
+                background:rgba(0,0,0,.8);color:#fff;font:bold 12px sans-serif}}
+    </style>
+    <a href="{video_url}">
+        <img src="{thumbnail}" alt="{html.escape(row['title'])}" loading="lazy">
+        <span class="play">&#9654;</span>
+        <span class="badge">{format_duration(row['duration_sec'], row['duration_status'])}</span>
+    </a>"""
+    return f"""
+                <iframe
+                    width="100%"
+                    height="200"
+                    srcdoc="{html.escape(doc)}"
+                    title="{html.escape(row['title'])}"
+                    frameborder="0"
+                    allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share"
+                    allowfullscreen
+                    style="border-radius: 10px 10px 0 0;">
+                </iframe>"""
+
+
+def membership_html(row):
+    """Lists the playlists holding the video, in combined views only."""
+    if 'playlists' not in row:
+        return ""
+    return f'<div class="video-meta">in {html.escape(str(row["playlists"]))}</div>'
+
+
+@functools.lru_cache(maxsize=CARD_CACHE_SIZE)
+def card_html(video_id, title, channel, duration_sec, duration_status, playlists, facade=True):
+    """
+    Returns one card's markup, split around its rank number, memoized per
+    video and display settings so page flips reuse it. The arguments are the
+    row's displayed fields, so refreshed details make a new entry. ``facade``
+    picks the click-to-load thumbnail over a live player. Titles and channels
+    are escaped: a page's cards share one markdown block.
+    """
+    row = {'id': video_id, 'title': title, 'duration_sec': duration_sec, 'duration_status': duration_status}
+    if playlists is not None:
+        row['playlists'] = playlists
+    media_html = facade_html if facade else player_html
+    title, channel = html.escape(str(title)), html.escape(str(channel))
+    head = f"""
+            <div class="video-card">{media_html(row)}
+                <div class="video-content">
+                    <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:0.5rem;">
+                        <span class="duration-badge">{format_duration(duration_sec, duration_status)}</span>
+                        <span class="video-meta" title="{duration_sec} sec">#"""
+    tail = f"""</span>
+                    </div>
+                    <a href="https://www.youtube.com/watch?v={video_id}" target="_blank" class="video-title" title="{title}">
+                        {title}
+                    </a>
+                    <div class="video-meta">by {channel}</div>{membership_html(row)}
+                    <div style="margin-top: 10px; text-align: right;">
+                         <a href="https://www.youtube.com/watch?v={video_id}" target="_blank" style="font-size: 0.8rem; color: #FF4D4D; text-decoration: none;">
+                            Open in YouTube ↗
+                         </a>
+                    </div>
+                </div>
+            </div>
+            """
+    return head, tail
@@ -0,0 +1,210 @@
+"""Command-line batch sorting, without Streamlit.
+
+Sorts any number of exported video ID lists and playlists in a process pool
+and writes one CSV, JSON, Parquet or Arrow file per input:
+
+    python -m playlist_sorter ids/*.txt --api-key KEY --format parquet -o sorted/
+    python -m playlist_sorter --playlist PLxxxx --credentials token.json --sort views --descending
+
+ID files can hold anything the app's paste box accepts (links, bare IDs,
+CSV exports). Public playlists only need an API key; private ones, including
+Watch Later, need an authorized-user token file from an OAuth flow. Every
+worker process builds its own client and opens the shared details cache, so
+videos already fetched by another worker or a previous night are reused.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from googleapiclient.discovery import build
+
+from .cache import DEFAULT_PATH, VideoCache
+from .export import write_snapshot
+from .fetch import DEFAULT_CONCURRENCY, iter_pasted_videos, iter_playlist_videos
+from .frames import build_frame, details_fetched_at
+from .metrics import Metrics
+from .sorting import SORT_COLUMNS, sort_frame
+from .transport import HttpPool
+from .video_ids import extract_video_ids
+
+SCOPES = ['https://www.googleapis.com/auth/youtube.readonly']
+
+# Output format -> file extension.
+FORMATS = {'csv': 'csv', 'json': 'json', 'parquet': 'parquet', 'arrow': 'arrow'}
+
+# Per-process state set up by ``_init_worker``.
+_worker = {}
+
+
+def _build_client(api_key=None, credentials_file=None):
+    """Returns ``(youtube, http_factory)`` for an API key or a token file."""
+    pool = HttpPool()
+    if credentials_file:
+        # Only token files need the OAuth libraries.
+        from google.oauth2.credentials import Credentials
+        from google_auth_httplib2 import AuthorizedHttp
+
+        credentials = Credentials.from_authorized_user_file(credentials_file, SCOPES)
+        http_factory = lambda: AuthorizedHttp(credentials, http=pool.acquire())
+        youtube = build('youtube', 'v3', http=http_factory(), static_discovery=True)
+        return youtube, http_factory
+
+    youtube = build('youtube', 'v3', http=pool.acquire(), developerKey=api_key, static_discovery=True)
+    return youtube, pool.acquire
+
+
+def _init_worker(api_key, credentials_file, cache_path, concurrency):
+    youtube, http_factory = _build_client(api_key, credentials_file)
+    _worker.update(
+        youtube=youtube,
+        http_factory=http_factory,
+        cache=VideoCache(cache_path) if cache_path else None,
+        concurrency=concurrency,
+    )
+
+
+def write_frame(df, path, fmt, fetched_at=None):
+    """
+    Writes ``df`` to ``path`` as ``fmt`` (one of ``FORMATS``). Parquet and
+    Arrow files are snapshots the app's import tab can load.
+    """
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+    elif fmt == 'json':
+        df.to_json(path, orient='records', indent=1)
+    elif fmt in ('parquet', 'arrow'):
+        write_snapshot(df, fmt, fetched_at, path=path)
+    else:
+        raise ValueError(f"Unknown output format: {fmt}")
+
+
+def run_job(kind, source, output, sort_key, ascending, fmt):
+    """
+    Fetches, sorts and writes one input in the current worker. ``kind`` is
+    'ids' (``source`` is a file of links or IDs) or 'playlist'. Returns a
+    summary dict; batch errors are counted rather than raised.
+    """
+    start = time.perf_counter()
+    fetched_at = time.time()
+    errors = []
+    metrics = Metrics()
+    options = dict(
+        cache=_worker['cache'],
+        http_factory=_worker['http_factory'],
+        concurrency=_worker['concurrency'],
+        on_error=errors.append,
+        metrics=metrics,
+    )
+    if kind == 'ids':
+        with open(source, encoding='utf-8', errors='replace') as f:
+            extracted = extract_video_ids(f.read())
+        batches = iter_pasted_videos(_worker['youtube'], extracted, **options)
+    else:
+        batches = iter_playlist_videos(_worker['youtube'], source, **options)
+    records = [video for batch in batches for video in batch]
+
+    summary = {
+        'source': source,
+        'output': None,
+        'videos': len(records),
+        'errors': [str(e) for e in errors],
+        'quota_units': sum(s['quota_units'] for s in metrics.snapshot()['endpoints'].values()),
+    }
+    if records:
+        df = sort_frame(build_frame(records), sort_key, ascending)
+        write_frame(df, output, fmt, details_fetched_at(records, default=fetched_at))
+        summary['output'] = output
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def _plan_jobs(args, parser):
+    """Returns ``(kind, source, output)`` per input, with distinct output paths."""
+    jobs = [('ids', path) for path in args.id_files] + [('playlist', pid) for pid in args.playlist]
+    planned, seen = [], {}
+    for kind, source in jobs:
+        stem = os.path.splitext(os.path.basename(source))[0] if kind == 'ids' else source
+        output = os.path.join(args.output_dir, f"{stem}.{FORMATS[args.format]}")
+        if output in seen:
+            parser.error(f"{source} and {seen[output]} would both be written to {output}")
+        seen[output] = source
+        planned.append((kind, source, output))
+    return planned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m playlist_sorter', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('id_files', nargs='*', help='files of video links or IDs, one output each')
+    parser.add_argument('--playlist', action='append', default=[], help='playlist ID to fetch (repeatable)')
+    parser.add_argument('--api-key', default=os.environ.get('YOUTUBE_API_KEY'),
+                        help='YouTube Data API key (default: $YOUTUBE_API_KEY)')
+    parser.add_argument('--credentials', help='authorized-user token JSON, for private playlists')
+    parser.add_argument('--sort', choices=list(SORT_COLUMNS), default='duration')
+    parser.add_argument('--descending', action='store_true')
+    parser.add_argument('--format', choices=list(FORMATS), default='csv')
+    parser.add_argument('-o', '--output-dir', default='.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='videos.list calls in flight per worker')
+    parser.add_argument('--cache', default=DEFAULT_PATH, help='details cache shared by all workers')
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args(argv)
+
+    if not args.id_files and not args.playlist:
+        parser.error('nothing to do: pass ID files and/or --playlist')
+    if not args.api_key and not args.credentials:
+        parser.error('pass --api-key (or set YOUTUBE_API_KEY) or --credentials')
+    jobs = _plan_jobs(args, parser)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    init_args = (args.api_key, args.credentials, None if args.no_cache else args.cache, args.concurrency)
+    job_args = (args.sort, not args.descending, args.format)
+    failed = 0
+    videos = 0
+    quota = 0
+
+    def report(source, summary=None, error=None):
+        nonlocal failed, videos, quota
+        if error is not None:
+            failed += 1
+            print(f"FAILED {source}: {error}", file=sys.stderr)
+            return
+        videos += summary['videos']
+        quota += summary['quota_units']
+        target = summary['output'] or 'no videos, nothing written'
+        print(f"{source} -> {target} ({summary['videos']} videos, "
+              f"{len(summary['errors'])} batch errors, {summary['seconds']:.1f}s)", file=sys.stderr)
+        for message in summary['errors']:
+            print(f"    {message}", file=sys.stderr)
+
+    start = time.perf_counter()
+    workers = max(1, min(args.jobs, len(jobs)))
+    if workers == 1:
+        # Nothing to parallelize; skip the pool's startup cost.
+        _init_worker(*init_args)
+        for kind, source, output in jobs:
+            try:
+                report(source, run_job(kind, source, output, *job_args))
+            except Exception as e:
+                report(source, error=e)
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=init_args) as pool:
+            futures = {
+                pool.submit(run_job, kind, source, output, *job_args): source
+                for kind, source, output in jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    report(futures[future], future.result())
+                except Exception as e:
+                    report(futures[future], error=e)
+
+    print(f"Done: {len(jobs) - failed}/{len(jobs)} inputs, {videos} videos, "
+          f"~{quota} quota units, {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,136 @@
+"""Coalescing of concurrent ``videos().list`` misses across sessions.
+
+Every session of the app runs in the same process, and many users keep the
+same popular videos. ``DetailCoalescer`` sits between ``fetch_video_details``
+and the API:
+
+* single flight: an ID (with the same parts) already queued or in flight is
+  joined instead of requested again;
+* batch filling: IDs are queued per set of parts, and a caller whose batch is
+  not full yet waits up to ``linger`` seconds for other callers' misses, so
+  calls go out with up to 50 IDs from whoever asked.
+
+There is no dispatcher thread: a caller with queued IDs takes the next batch
+off the queue and makes the call itself, with its own client. Only public and
+unlisted results are handed to other callers or stored in the shared cache.
+Anything another caller's request did not resolve for us (a video only our
+credentials can see, or a failed call) is fetched again with ours.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .fetch import BATCH_SIZE, fetch_parts, request_details
+
+DEFAULT_LINGER = 0.02
+
+
+class DetailCoalescer:
+    """Process-wide single-flight, batch-filling front for ``videos().list``."""
+
+    def __init__(self, cache=None, linger=DEFAULT_LINGER):
+        self.cache = cache
+        self.linger = linger
+        self._cond = threading.Condition()
+        self._pending = {}   # (parts, id) -> Future of (record, shareable, leader, error)
+        self._queues = {}    # parts -> OrderedDict of IDs not yet taken by a caller
+
+    def fetch(self, youtube, refresh, http=None, metrics=None):
+        """
+        Fetches ``refresh`` (``{id: parts}``) like ``fetch.fetch_parts``,
+        sharing calls with concurrent callers. Returns
+        ``(fetched, missing, errors)``.
+        """
+        me = object()
+        waiting = {}   # id -> future, ours or joined
+        mine = []      # keys we queued
+        with self._cond:
+            for vid, parts in refresh.items():
+                key = (parts, vid)
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = Future()
+                    self._queues.setdefault(parts, OrderedDict())[vid] = None
+                    mine.append(key)
+                waiting[vid] = future
+            # A lingering caller's batch may be full now.
+            self._cond.notify_all()
+
+        errors = self._lead(youtube, mine, me, http, metrics)
+
+        fetched, missing, retry = {}, set(), {}
+        borrowed = 0
+        for vid, future in waiting.items():
+            record, shareable, leader, error = future.result()
+            if leader is me:
+                if error is not None:
+                    if not any(error is e for e in errors):
+                        errors.append(error)
+                elif record is None:
+                    missing.add(vid)
+                else:
+                    fetched[vid] = record
+            elif record is not None and shareable:
+                fetched[vid] = record
+                borrowed += 1
+            else:
+                retry[vid] = refresh[vid]
+
+        if metrics is not None:
+            metrics.record_coalesced(borrowed)
+        if retry:
+            more, gone, failed = fetch_parts(youtube, retry, self.cache, http, metrics)
+            fetched.update(more)
+            missing.update(gone)
+            errors.extend(failed)
+        return fetched, missing, errors
+
+    def _lead(self, youtube, mine, me, http, metrics):
+        """
+        Makes calls until none of ``mine`` is left in a queue; returns the
+        errors storing their results in the cache.
+        """
+        lingered = False
+        cache_errors = []
+        while True:
+            with self._cond:
+                queued = [(parts, vid) for parts, vid in mine if vid in self._queues.get(parts, ())]
+                if not queued:
+                    return cache_errors
+                parts = queued[0][0]
+                queue = self._queues[parts]
+                if not lingered and len(queue) < BATCH_SIZE:
+                    lingered = True
+                    ours = [vid for p, vid in queued if p == parts]
+                    # Also done waiting once another caller has taken all of ours.
+                    self._cond.wait_for(
+                        lambda: len(queue) >= BATCH_SIZE or not any(vid in queue for vid in ours),
+                        timeout=self.linger,
+                    )
+                    continue
+                batch = [queue.popitem(last=False)[0] for _ in range(min(BATCH_SIZE, len(queue)))]
+                self._cond.notify_all()
+            cache_error = self._run(youtube, parts, batch, me, http, metrics)
+            if cache_error is not None:
+                cache_errors.append(cache_error)
+
+    def _run(self, youtube, parts, batch, me, http, metrics):
+        by_id, shared, error, cache_error = {}, set(), None, None
+        try:
+            records, shareable = request_details(youtube, batch, parts, http, metrics)
+            by_id = {rec['id']: rec for rec in records}
+            shared = {rec['id'] for rec in shareable}
+            if self.cache is not None:
+                try:
+                    self.cache.put_many(shareable, parts)
+                except Exception as e:
+                    # The details are in hand: only this caller hears about it.
+                    cache_error = e
+        except Exception as e:
+            error = e
+        finally:
+            with self._cond:
+                futures = [self._pending.pop((parts, vid)) for vid in batch]
+            for vid, future in zip(batch, futures):
+                future.set_result((by_id.get(vid), vid in shared, me, error))
+        return cache_error
@@ -0,0 +1,67 @@
+"""Parsing and display helpers for YouTube video durations.
+
+Durations are parsed in bulk: one compiled regex is applied to a whole
+column of ISO-8601 strings with pandas, so normalizing a large export is a
+single vectorized pass. Parsing yields integer seconds plus a status, so live
+streams and malformed values stay distinguishable instead of becoming 0.
+Display strings are only built for the rows being rendered.
+"""
+import re
+
+import pandas as pd
+
+DURATION_OK = 'ok'
+DURATION_LIVE = 'live'          # live or upcoming broadcasts report P0D
+DURATION_INVALID = 'invalid'    # missing or not an ISO-8601 duration
+
+# The subset of ISO-8601 durations the YouTube API emits.
+ISO_DURATION_RE = re.compile(
+    r'^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)(?:\.\d+)?S)?)?$'
+)
+_UNIT_SECONDS = {'weeks': 604800, 'days': 86400, 'hours': 3600, 'minutes': 60, 'seconds': 1}
+
+
+def parse_durations(values):
+    """
+    Parses a sequence of ISO-8601 duration strings in one pass.
+
+    Returns a DataFrame aligned with ``values`` with an ``Int64``
+    ``duration_sec`` column (``<NA>`` unless the status is ok) and a
+    ``duration_status`` column.
+    """
+    raw = pd.Series(values, dtype='string')
+    parts = raw.str.extract(ISO_DURATION_RE)
+    # Unmatched strings extract as all-NA rows (as do bare "P"/"PT", also invalid).
+    matched = parts.notna().any(axis=1)
+
+    seconds = pd.Series(0, index=raw.index, dtype='int64')
+    for unit, factor in _UNIT_SECONDS.items():
+        seconds += parts[unit].fillna('0').astype('int64') * factor
+
+    status = pd.Series(DURATION_OK, index=raw.index, dtype=object)
+    status[matched & (seconds == 0)] = DURATION_LIVE
+    status[~matched] = DURATION_INVALID
+
+    duration_sec = seconds.astype('Int64')
+    duration_sec[status != DURATION_OK] = pd.NA
+    return pd.DataFrame({'duration_sec': duration_sec, 'duration_status': status})
+
+
+def format_duration(seconds, status=DURATION_OK):
+    if status == DURATION_LIVE: return "Live"
+    if status != DURATION_OK or pd.isna(seconds): return "?"
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    if h > 0:
+        return f"{h}:{m:02d}:{s:02d}"
+    else:
+        return f"{m}:{s:02d}"
+
+
+def format_durations(df):
+    """Formats the durations of ``df``; meant for the rows on screen only."""
+    return [
+        format_duration(sec, status)
+        for sec, status in zip(df['duration_sec'], df['duration_status'])
+    ]
@@ -0,0 +1,77 @@
+"""Saving and reloading a loaded library as a Parquet or Arrow IPC snapshot.
+
+A snapshot is the videos frame plus a little metadata in the file's schema:
+the format version and when its details were fetched (``fetched_at``, a Unix
+timestamp), so an old snapshot can be refreshed once its view counts go
+stale. Arrow IPC files are written uncompressed and read without copying:
+files on disk are memory-mapped, uploaded bytes are wrapped as a buffer.
+"""
+import json
+from collections import namedtuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .frames import build_frame
+
+FORMATS = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+}
+
+FORMAT_VERSION = 1
+REQUIRED_COLUMNS = ('id', 'title', 'channel', 'duration_sec', 'view_count')
+
+_META_KEY = b'watch_later_sorter'
+_ARROW_MAGIC = b'ARROW1'
+_PARQUET_MAGIC = b'PAR1'
+
+LoadedSnapshot = namedtuple('LoadedSnapshot', 'frame fetched_at')
+
+
+def write_snapshot(df, fmt='parquet', fetched_at=None, path=None):
+    """Writes ``df`` as ``fmt`` to ``path``, or returns the bytes without one."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = json.dumps({'format_version': FORMAT_VERSION, 'fetched_at': fetched_at}).encode()
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _META_KEY: meta})
+
+    sink = pa.OSFile(path, 'wb') if path is not None else pa.BufferOutputStream()
+    if fmt == 'parquet':
+        pq.write_table(table, sink)
+    elif fmt == 'arrow':
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"Unknown snapshot format: {fmt}")
+    if path is not None:
+        sink.close()
+        return None
+    return sink.getvalue().to_pybytes()
+
+
+def read_snapshot(source):
+    """
+    Loads a snapshot from a path or from bytes / a binary file object, telling
+    Parquet and Arrow apart by their magic bytes. Returns a ``LoadedSnapshot``;
+    ``fetched_at`` is None for files written elsewhere.
+    """
+    if isinstance(source, str):
+        buffer = pa.memory_map(source)
+    else:
+        data = source.getbuffer() if hasattr(source, 'getbuffer') else source
+        buffer = pa.BufferReader(pa.py_buffer(data))
+
+    magic = buffer.read(6)
+    buffer.seek(0)
+    if magic.startswith(_ARROW_MAGIC):
+        table = pa.ipc.open_file(buffer).read_all()
+    elif magic.startswith(_PARQUET_MAGIC):
+        table = pq.read_table(buffer)
+    else:
+        raise ValueError("Not a Parquet or Arrow IPC file.")
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in table.column_names]
+    if missing:
+        raise ValueError(f"Not a videos snapshot; missing columns: {', '.join(missing)}")
+    meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b'{}'))
+    return LoadedSnapshot(build_frame(table.to_pandas()), meta.get('fetched_at'))
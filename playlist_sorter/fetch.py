@@ -0,0 +1,474 @@
+"""YouTube Data API fetching helpers.
+
+Playlist pages are walked on the calling thread while ``videos().list``
+batches run on a bounded thread pool, so a page's details are fetched while
+the next page token is being followed. ``httplib2`` connections are not
+thread-safe, so every worker gets its own from ``http_factory``; without a
+factory the details are fetched inline and nothing runs concurrently.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from .cache import ALL_PARTS
+from .durations import parse_durations
+from .metrics import execute, stage
+
+# videos().list accepts at most 50 IDs per call.
+BATCH_SIZE = 50
+DEFAULT_CONCURRENCY = 4
+
+# fields= masks: only the keys the records are built from, per part.
+PART_FIELDS = {
+    'snippet': 'snippet(title,channelTitle,thumbnails/medium/url)',
+    'contentDetails': 'contentDetails/duration',
+    'statistics': 'statistics/viewCount',
+    'status': 'status/privacyStatus',
+}
+PLAYLIST_ITEM_FIELDS = 'nextPageToken,items/contentDetails/videoId'
+PLAYLIST_FIELDS = 'nextPageToken,items(id,snippet/title)'
+
+# Joins the playlists a video belongs to in the combined view.
+MEMBERSHIP_SEP = ' | '
+
+# Only these videos' details go into caches shared between users.
+SHAREABLE_PRIVACY = ('public', 'unlisted')
+
+# Record fields for a requested part an item came back without (statistics
+# are left out for some videos, for instance).
+PART_DEFAULTS = {
+    'snippet': {'title': '', 'thumbnail': '', 'channel': ''},
+    'statistics': {'view_count': 0},
+}
+
+
+def video_record(item, base=None, parts=()):
+    """
+    Builds (or updates ``base`` into) a flat video record from an API item.
+    Durations are filled in separately, per response, by ``parse_durations``.
+    Fields of ``parts`` the item lacks get their ``PART_DEFAULTS``.
+    """
+    record = dict(base) if base else {'id': item['id']}
+    for part in parts:
+        if part not in item:
+            for column, value in PART_DEFAULTS.get(part, {}).items():
+                record.setdefault(column, value)
+    if 'snippet' in item:
+        record['title'] = item['snippet']['title']
+        record['thumbnail'] = item['snippet']['thumbnails'].get('medium', {}).get('url', '')
+        record['channel'] = item['snippet']['channelTitle']
+    if 'statistics' in item:
+        record['view_count'] = int(item['statistics'].get('viewCount', 0))
+        record['fetched_at'] = time.time()
+    return record
+
+
+def request_details(youtube, video_ids, parts, http=None, metrics=None):
+    """
+    Makes one ``videos().list`` call for up to 50 IDs and returns
+    ``(records, shareable)``. ``records`` hold only the fields of ``parts``
+    for the IDs the API returned; ``shareable`` is the subset of them that
+    is public or unlisted and may be served to other users.
+    """
+    parts = parts + ('status',)
+    response = execute(youtube.videos().list(
+        part=",".join(parts),
+        id=",".join(video_ids),
+        fields=f"items(id,{','.join(PART_FIELDS[part] for part in parts)})"
+    ), metrics, http)
+    items = response['items']
+    records = [video_record(item, parts=parts) for item in items]
+    if 'contentDetails' in parts:
+        with stage(metrics, 'parse'):
+            durations = parse_durations([item.get('contentDetails', {}).get('duration') for item in items])
+            for record, sec, status in zip(records, durations['duration_sec'], durations['duration_status']):
+                record['duration_sec'] = None if pd.isna(sec) else int(sec)
+                record['duration_status'] = status
+    shareable = [
+        record for record, item in zip(records, items)
+        if item.get('status', {}).get('privacyStatus') in SHAREABLE_PRIVACY
+    ]
+    return records, shareable
+
+
+def fetch_parts(youtube, refresh, cache=None, http=None, metrics=None):
+    """
+    Fetches the parts each ID of ``refresh`` (``{id: parts}``) needs, 50 IDs
+    per call, and stores the shareable results in ``cache``.
+
+    Returns ``(fetched, missing, errors)``: partial records by ID, the IDs a
+    successful call did not return, and the exceptions of failed calls and
+    cache writes.
+    """
+    fetched, missing, errors = {}, set(), []
+    # Group IDs by the parts they need so each call asks for as little as possible.
+    by_parts = {}
+    for vid, parts in refresh.items():
+        by_parts.setdefault(parts, []).append(vid)
+
+    for parts, ids in by_parts.items():
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = ids[i:i + BATCH_SIZE]
+            try:
+                records, shareable = request_details(youtube, batch, parts, http, metrics)
+            except Exception as e:
+                errors.append(e)
+                continue
+            if cache is not None:
+                try:
+                    cache.put_many(shareable, parts)
+                except Exception as e:
+                    # Still serve what was fetched.
+                    errors.append(e)
+            fetched.update((rec['id'], rec) for rec in records)
+            missing.update(vid for vid in batch if vid not in fetched)
+    return fetched, missing, errors
+
+
+def fetch_video_details(youtube, video_ids, cache=None, on_error=None, http=None, metrics=None,
+                        coalescer=None, stale_ok=()):
+    """
+    Returns video records for ``video_ids`` in the same order.
+
+    Cached records are served without an API call; stale ones only request
+    the parts that expired. IDs the API does not return (deleted or private
+    videos) are left out. ``on_error`` is called with the exception of a failed
+    batch; without it the exception propagates. With a ``coalescer``, misses
+    are fetched together with other callers' (see ``coalesce``). Cached
+    details of the IDs in ``stale_ok`` are served however old they are.
+    """
+    if cache is not None:
+        records, refresh = cache.get_many(video_ids, stale_ok=stale_ok)
+        if metrics is not None:
+            metrics.record_cache(hits=len(records) - sum(vid in records for vid in refresh),
+                                 misses=len(refresh))
+    else:
+        records, refresh = {}, {vid: ALL_PARTS for vid in dict.fromkeys(video_ids)}
+
+    if coalescer is not None:
+        fetched, missing, errors = coalescer.fetch(youtube, refresh, http=http, metrics=metrics)
+    else:
+        fetched, missing, errors = fetch_parts(youtube, refresh, cache, http, metrics)
+
+    for e in errors:
+        if on_error is None:
+            raise e
+        on_error(e)
+    for vid, record in fetched.items():
+        records[vid] = dict(records.get(vid, {}), **record)
+    # Anything missing from a successful response was deleted or made private.
+    for vid in missing:
+        records.pop(vid, None)
+
+    return [records[vid] for vid in dict.fromkeys(video_ids) if vid in records]
+
+
+class DetailFetcher:
+    """
+    Runs ``fetch_video_details`` batches on a bounded thread pool.
+
+    ``submit`` returns a future resolving to ``(videos, errors)``. Batch errors
+    are collected rather than reported from the worker thread, so callers can
+    surface them on their own thread.
+    """
+
+    def __init__(self, youtube, cache=None, http_factory=None, concurrency=DEFAULT_CONCURRENCY,
+                 metrics=None, coalescer=None):
+        self.youtube = youtube
+        self.cache = cache
+        self.metrics = metrics
+        self.coalescer = coalescer
+        self.http_factory = http_factory
+        workers = max(1, concurrency) if http_factory is not None else 1
+        self._inline = http_factory is None
+        self._pool = None if self._inline else ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='yt-details'
+        )
+        self._local = threading.local()
+        self._opened = []
+
+    def _http(self):
+        if self._inline:
+            return None
+        if not hasattr(self._local, 'http'):
+            self._local.http = self.http_factory()
+            self._opened.append(self._local.http)
+        return self._local.http
+
+    def _run(self, video_ids, stale_ok=()):
+        errors = []
+        videos = fetch_video_details(
+            self.youtube, video_ids, cache=self.cache,
+            on_error=errors.append, http=self._http(), metrics=self.metrics,
+            coalescer=self.coalescer, stale_ok=stale_ok
+        )
+        return videos, errors
+
+    def submit(self, video_ids, stale_ok=()):
+        if self._inline:
+            # Share the caller's connection: run now and hand back a done future.
+            future = Future()
+            future.set_result(self._run(video_ids, stale_ok))
+            return future
+        return self._pool.submit(self._run, video_ids, stale_ok)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        # Pooled connections go back to their pool here.
+        for http in self._opened:
+            http.close()
+        self._opened = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _drain(futures, on_error, block):
+    """Yields finished batches from the head of ``futures``, keeping their order."""
+    while futures and (block or futures[0].done()):
+        batch, errors = futures.popleft().result()
+        for e in errors:
+            if on_error is None:
+                raise e
+            on_error(e)
+        yield batch
+
+
+def iter_details_concurrently(youtube, video_ids, cache=None, on_error=None,
+                              http_factory=None, concurrency=DEFAULT_CONCURRENCY, metrics=None,
+                              coalescer=None):
+    """
+    Yields batches of video records for ``video_ids``, in order, while the
+    50-ID ``videos().list`` calls run in parallel.
+    """
+    ids = list(dict.fromkeys(video_ids))
+    with DetailFetcher(youtube, cache, http_factory, concurrency, metrics, coalescer) as fetcher:
+        futures = deque(
+            fetcher.submit(ids[i:i + BATCH_SIZE]) for i in range(0, len(ids), BATCH_SIZE)
+        )
+        yield from _drain(futures, on_error, block=True)
+
+
+def iter_playlist_videos(youtube, playlist_id, cache=None, on_error=None,
+                         http_factory=None, concurrency=DEFAULT_CONCURRENCY,
+                         on_progress=None, metrics=None, coalescer=None, should_stop=None):
+    """
+    Yields batches of video records for every item of ``playlist_id``.
+
+    Batches come out in playlist order as soon as their details are in, so the
+    first page is available while later pages are still being walked. Errors
+    listing the playlist itself propagate; per-batch detail errors go to
+    ``on_error``. ``on_progress`` receives the number of playlist items walked
+    so far after each page. ``should_stop()`` is checked before every page; once
+    it returns true the walk ends and nothing more is yielded.
+    """
+    request = youtube.playlistItems().list(
+        part="contentDetails",
+        playlistId=playlist_id,
+        maxResults=50,
+        fields=PLAYLIST_ITEM_FIELDS
+    )
+
+    futures = deque()
+    walked = 0
+    with DetailFetcher(youtube, cache, http_factory, concurrency, metrics, coalescer) as fetcher:
+        while request:
+            if should_stop is not None and should_stop():
+                return
+            response = execute(request, metrics)
+            video_ids = [item['contentDetails']['videoId'] for item in response['items']]
+            if video_ids:
+                futures.append(fetcher.submit(video_ids))
+            walked += len(video_ids)
+            if on_progress is not None:
+                on_progress(walked)
+
+            yield from _drain(futures, on_error, block=False)
+            request = youtube.playlistItems().list_next(request, response)
+
+        yield from _drain(futures, on_error, block=True)
+
+
+def fetch_playlist_videos(youtube, playlist_id, **kwargs):
+    """Fetches every video of ``playlist_id`` in playlist order."""
+    return [video for batch in iter_playlist_videos(youtube, playlist_id, **kwargs) for video in batch]
+
+
+def _walk_playlist(youtube, playlist_id, on_page, http=None, metrics=None, should_stop=None):
+    """
+    Calls ``on_page(video_ids)`` for every page of ``playlist_id``, in order,
+    until ``should_stop()`` returns true.
+    """
+    request = youtube.playlistItems().list(
+        part="contentDetails",
+        playlistId=playlist_id,
+        maxResults=50,
+        fields=PLAYLIST_ITEM_FIELDS
+    )
+    while request:
+        if should_stop is not None and should_stop():
+            return
+        response = execute(request, metrics, http)
+        on_page([item['contentDetails']['videoId'] for item in response['items']])
+        request = youtube.playlistItems().list_next(request, response)
+
+
+def iter_combined_videos(youtube, playlist_ids, labels=None, cache=None, on_error=None,
+                         http_factory=None, concurrency=DEFAULT_CONCURRENCY,
+                         on_progress=None, metrics=None, coalescer=None, should_stop=None):
+    """
+    Yields batches of video records for the union of ``playlist_ids``.
+
+    The playlists are walked concurrently (one connection per walk, from
+    ``http_factory``), and every video is fetched once however many playlists
+    hold it: new IDs from any walk are pooled into full 50-ID details batches
+    while the walks go on. Once every walk is done, records come out in
+    playlist order, each video where it first appears, with a ``playlists``
+    column naming the playlists that hold it (``labels`` maps playlist IDs to
+    the names to use, joined by ``MEMBERSHIP_SEP``). Errors walking one
+    playlist go to ``on_error`` and the others carry on; ``on_progress``
+    receives the number of playlist items walked so far. Every walk checks
+    ``should_stop()`` before each page; once it returns true the walks end and
+    nothing is yielded.
+    """
+    labels = labels or {}
+    lock = threading.Lock()
+    items = {pid: [] for pid in playlist_ids}
+    future_of = {}   # video ID -> future of the details batch holding it
+    queued = set()   # every ID seen so far
+    pending = []     # new IDs not yet in a batch
+    walked = [0]
+
+    with DetailFetcher(youtube, cache, http_factory, concurrency, metrics, coalescer) as fetcher:
+        def submit(ids):
+            future = fetcher.submit(ids)
+            for vid in ids:
+                future_of[vid] = future
+
+        def walk(playlist_id):
+            def on_page(video_ids):
+                with lock:
+                    items[playlist_id].extend(video_ids)
+                    walked[0] += len(video_ids)
+                    for vid in video_ids:
+                        if vid not in queued:
+                            queued.add(vid)
+                            pending.append(vid)
+                    while len(pending) >= BATCH_SIZE:
+                        submit(pending[:BATCH_SIZE])
+                        del pending[:BATCH_SIZE]
+            if http_factory is None:
+                _walk_playlist(youtube, playlist_id, on_page, None, metrics, should_stop)
+                return
+            http = http_factory()
+            try:
+                _walk_playlist(youtube, playlist_id, on_page, http, metrics, should_stop)
+            finally:
+                http.close()
+
+        walk_errors = []
+        if http_factory is None:
+            for pid in playlist_ids:
+                try:
+                    walk(pid)
+                except Exception as e:
+                    walk_errors.append(e)
+                if on_progress is not None:
+                    on_progress(walked[0])
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, concurrency),
+                                    thread_name_prefix='yt-walk') as walkers:
+                remaining = {walkers.submit(walk, pid) for pid in playlist_ids}
+                while remaining:
+                    done, remaining = wait(remaining, timeout=0.25, return_when=FIRST_COMPLETED)
+                    walk_errors.extend(f.exception() for f in done if f.exception() is not None)
+                    # Progress is reported from the calling thread only.
+                    if on_progress is not None:
+                        on_progress(walked[0])
+        if should_stop is not None and should_stop():
+            return
+        for e in walk_errors:
+            if on_error is None:
+                raise e
+            on_error(e)
+        if pending:
+            submit(pending)
+
+        # Membership, in the order the playlists were given.
+        member_of = {}
+        for pid in playlist_ids:
+            for vid in dict.fromkeys(items[pid]):
+                member_of.setdefault(vid, []).append(labels.get(pid, pid))
+
+        records_of = {}
+        reported = set()
+        batch = []
+        for vid in member_of:
+            future = future_of[vid]
+            if future not in reported:
+                reported.add(future)
+                videos, errors = future.result()
+                records_of.update((rec['id'], rec) for rec in videos)
+                for e in errors:
+                    if on_error is None:
+                        raise e
+                    on_error(e)
+            record = records_of.get(vid)
+            if record is None:
+                continue
+            batch.append(dict(record, playlists=MEMBERSHIP_SEP.join(member_of[vid])))
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def fetch_combined_videos(youtube, playlist_ids, **kwargs):
+    """Fetches the union of ``playlist_ids`` as one list; see ``iter_combined_videos``."""
+    return [video for batch in iter_combined_videos(youtube, playlist_ids, **kwargs) for video in batch]
+
+
+def iter_pasted_videos(youtube, extracted, **kwargs):
+    """
+    Yields batches of video records for ``extracted`` (see
+    ``video_ids.extract_video_ids``), each carrying the ``position`` its ID
+    first appeared at, so "original order" follows the paste.
+    """
+    position_of = dict(zip(extracted.ids, extracted.positions))
+    for batch in iter_details_concurrently(youtube, extracted.ids, **kwargs):
+        yield [dict(record, position=position_of[record['id']]) for record in batch]
+
+
+def fetch_playlists(youtube, metrics=None):
+    """Returns ``{'id', 'title'}`` for every playlist of the signed-in user."""
+    playlists = []
+    request = youtube.playlists().list(
+        part="snippet",
+        mine=True,
+        maxResults=50,
+        fields=PLAYLIST_FIELDS
+    )
+    while request:
+        response = execute(request, metrics)
+        for item in response['items']:
+            playlists.append({
+                'id': item['id'],
+                'title': item['snippet']['title']
+            })
+        request = youtube.playlists().list_next(request, response)
+    return playlists
+
+
+def fetch_channel_id(youtube, metrics=None):
+    """Returns the signed-in user's channel ID, or None if they have no channel."""
+    response = execute(youtube.channels().list(part="id", mine=True, fields="items/id"), metrics)
+    items = response.get('items') or []
+    return items[0]['id'] if items else None
@@ -0,0 +1,47 @@
+"""Building the videos DataFrame the app sorts and renders."""
+import pandas as pd
+
+from .durations import DURATION_OK
+
+
+def thumbnail_url(video_id, size='mqdefault'):
+    """Returns the thumbnail URL YouTube serves for ``video_id`` at ``size``."""
+    return f"https://i.ytimg.com/vi/{video_id}/{size}.jpg"
+
+
+def details_fetched_at(records, default=None):
+    """
+    Returns when the stalest view count among ``records`` was fetched (the
+    records carry it as ``fetched_at``, from the API or the details cache),
+    or ``default`` if none says.
+    """
+    return min((rec['fetched_at'] for rec in records if rec.get('fetched_at') is not None), default=default)
+
+
+def build_frame(records):
+    """
+    Builds the compact videos frame from a list of records: categorical
+    channels and duration statuses, ``Int32`` durations (nullable), ``int64``
+    view counts and ``int32`` positions. Nothing derivable is stored:
+    thumbnails come from ``thumbnail_url``, display strings from
+    ``durations.format_durations``, and the records' fetch times are
+    summarized by ``details_fetched_at`` beforehand. Records arrive in
+    playlist or paste order; unless they carry their own ``position``, that
+    order becomes it.
+    """
+    df = pd.DataFrame(records)
+    # Snapshots written before durations carried a status stored a display string instead.
+    df = df.drop(columns=['duration_fmt', 'thumbnail', 'fetched_at'], errors='ignore')
+    if 'duration_status' not in df:
+        df['duration_status'] = DURATION_OK
+    df['channel'] = df['channel'].astype('category')
+    df['duration_status'] = df['duration_status'].astype('category')
+    if 'playlists' in df:
+        # Combined views: few distinct membership combinations, many rows.
+        df['playlists'] = df['playlists'].astype('category')
+    df['duration_sec'] = pd.to_numeric(df['duration_sec']).round().astype('Int32')
+    df['view_count'] = df['view_count'].fillna(0).astype('int64')
+    if 'position' not in df:
+        df['position'] = range(len(df))
+    df['position'] = df['position'].astype('int32')
+    return df
@@ -0,0 +1,164 @@
+"""Background fetch jobs that outlive the script run which started them.
+
+A ``FetchJob`` drains an iterable of record batches on a worker thread and
+keeps everything that has arrived so far, so a caller can show partial
+results, poll ``progress()`` from any thread, or ``cancel()`` it.
+``JobManager`` runs the jobs on a bounded pool and keeps them under a key
+(the app uses session and source), so asking for a fetch that is already
+running joins it instead of starting it again.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 8
+# Finished jobs are forgotten this long after they end, unless discarded earlier.
+DEFAULT_FINISHED_TTL = 3600
+
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = 'queued', 'running', 'done', 'cancelled', 'failed'
+
+JobProgress = namedtuple('JobProgress', 'state videos batches walked errors message error')
+
+
+class FetchJob:
+    """
+    One fetch in flight. The fetch function receives the job and should pass
+    ``job.on_error``, ``job.on_progress`` and ``job.should_stop`` to the
+    ``fetch`` iterators, and may report a status line with ``job.note``.
+    """
+
+    def __init__(self, label=''):
+        self.label = label
+        self.state = QUEUED
+        self.started_at = time.time()
+        self.finished_at = None
+        self._records = []
+        self._batches = 0
+        self._walked = 0
+        self._errors = []
+        self._message = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    # --- Called by the fetch, on the worker thread ---
+
+    def on_error(self, error):
+        with self._lock:
+            self._errors.append(error)
+
+    def on_progress(self, walked):
+        self._walked = walked
+
+    def note(self, message):
+        self._message = message
+
+    def should_stop(self):
+        return self._cancel.is_set()
+
+    # --- Called by anyone ---
+
+    @property
+    def running(self):
+        return self.state in (QUEUED, RUNNING)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """
+        Asks the job to stop; it does so at the next batch, or at the next
+        playlist page if the fetch checks ``should_stop``.
+        """
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished; returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def records(self):
+        """Returns a copy of the records that have arrived so far, in order."""
+        with self._lock:
+            return list(self._records)
+
+    def progress(self):
+        """Returns a consistent ``JobProgress`` snapshot."""
+        with self._lock:
+            return JobProgress(self.state, len(self._records), self._batches, self._walked,
+                               list(self._errors), self._message, self._error)
+
+    def _run(self, fetch):
+        batches = None
+        state = CANCELLED
+        try:
+            if not self._cancel.is_set():
+                self.state = RUNNING
+                batches = fetch(self)
+                for batch in batches:
+                    if self._cancel.is_set():
+                        break
+                    if batch:
+                        with self._lock:
+                            self._records.extend(batch)
+                            self._batches += 1
+                else:
+                    # A fetch that saw should_stop() ends early rather than breaking.
+                    state = CANCELLED if self._cancel.is_set() else DONE
+        except Exception as e:
+            self._error = e
+            state = FAILED
+        finally:
+            # Closing a fetch generator shuts its detail threads down and
+            # returns its connections.
+            close = getattr(batches, 'close', None)
+            if close is not None:
+                close()
+            self.finished_at = time.time()
+            self.state = state
+            self._done.set()
+
+
+class JobManager:
+    """Thread-safe registry of keyed ``FetchJob``s running on a shared pool."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, finished_ttl=DEFAULT_FINISHED_TTL):
+        self.finished_ttl = finished_ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yt-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fetch, label=''):
+        """
+        Starts ``fetch(job)``, which returns an iterable of record batches, as
+        the job for ``key``, and returns the job. If the job for ``key`` is
+        still running it is returned instead and ``fetch`` is not called.
+        """
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(key)
+            if job is not None and job.running:
+                return job
+            job = self._jobs[key] = FetchJob(label)
+        self._pool.submit(job._run, fetch)
+        return job
+
+    def get(self, key):
+        """Returns the job for ``key``, or None."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def discard(self, key):
+        """Cancels the job for ``key`` if it is running and forgets it."""
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if job is not None:
+            job.cancel()
+
+    def _prune(self):
+        cutoff = time.time() - self.finished_ttl
+        for key, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[key]
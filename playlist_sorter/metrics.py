@@ -0,0 +1,208 @@
+"""Instrumentation of YouTube API calls and local processing stages.
+
+``execute`` wraps every API request: it records wall time, decoded response
+bytes, pages (successful responses), 304s, errors and estimated quota units
+per endpoint. ``stage`` times local work such as parsing, building the frame,
+sorting, searching and rendering, so API latency and local cost can be told
+apart. Each ``Metrics`` can forward everything it records to a ``parent``;
+the app keeps one per session plus a process-wide one for the daily quota,
+which is shared by every user of the Google Cloud project.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from .transport import WIRE_LENGTH_HEADER
+
+# Estimated quota cost per call. Every list method used here costs 1 unit;
+# conditional requests answered with 304 are counted too, to stay on the safe side.
+QUOTA_UNITS = {
+    'youtube.videos.list': 1,
+    'youtube.playlistItems.list': 1,
+    'youtube.playlists.list': 1,
+}
+DEFAULT_QUOTA_UNITS = 1
+
+# YouTube Data API quotas reset at midnight Pacific time.
+QUOTA_TZ = ZoneInfo('America/Los_Angeles')
+
+_ENDPOINT_FIELDS = ('requests', 'pages', 'not_modified', 'errors', 'seconds', 'bytes', 'wire_bytes',
+                    'quota_units')
+
+
+class Metrics:
+    """Thread-safe counters for API endpoints, local stages and cache lookups."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.endpoints = {}
+            self.stages = {}
+            self.cache = {'hits': 0, 'misses': 0, 'coalesced': 0}
+            self.quota_by_day = {}
+
+    def record_request(self, endpoint, seconds, nbytes, status, wire_bytes=None):
+        """
+        Records one API call; ``status`` is 'ok', 'not_modified' or 'error'.
+        ``nbytes`` is the decoded body size and ``wire_bytes`` what actually
+        came over the network (the same when unknown).
+        """
+        wire_bytes = nbytes if wire_bytes is None else wire_bytes
+        units = QUOTA_UNITS.get(endpoint, DEFAULT_QUOTA_UNITS)
+        day = datetime.now(QUOTA_TZ).date().isoformat()
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, dict.fromkeys(_ENDPOINT_FIELDS, 0))
+            stats['requests'] += 1
+            stats['seconds'] += seconds
+            stats['bytes'] += nbytes
+            stats['wire_bytes'] += wire_bytes
+            stats['quota_units'] += units
+            if status == 'ok':
+                stats['pages'] += 1
+            elif status == 'not_modified':
+                stats['not_modified'] += 1
+            else:
+                stats['errors'] += 1
+            self.quota_by_day[day] = self.quota_by_day.get(day, 0) + units
+        if self.parent is not None:
+            self.parent.record_request(endpoint, seconds, nbytes, status, wire_bytes)
+
+    def record_stage(self, name, seconds):
+        with self._lock:
+            stats = self.stages.setdefault(name, {'runs': 0, 'seconds': 0.0, 'last': 0.0, 'max': 0.0})
+            stats['runs'] += 1
+            stats['seconds'] += seconds
+            stats['last'] = seconds
+            stats['max'] = max(stats['max'], seconds)
+        if self.parent is not None:
+            self.parent.record_stage(name, seconds)
+
+    def record_cache(self, hits, misses):
+        with self._lock:
+            self.cache['hits'] += hits
+            self.cache['misses'] += misses
+        if self.parent is not None:
+            self.parent.record_cache(hits, misses)
+
+    def record_coalesced(self, count):
+        """Counts cache misses answered by another caller's API request."""
+        with self._lock:
+            self.cache['coalesced'] += count
+        if self.parent is not None:
+            self.parent.record_coalesced(count)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def execute(self, request, http=None):
+        """Executes a googleapiclient request, recording how it went."""
+        endpoint = getattr(request, 'methodId', None) or 'unknown'
+        received = [0, None]
+        postproc = request.postproc
+
+        def counting_postproc(resp, content):
+            received[0] = len(content or b'')
+            wire = resp.get(WIRE_LENGTH_HEADER)
+            received[1] = None if wire is None else int(wire)
+            return postproc(resp, content)
+
+        # Restored afterwards: list_next() copies the request, wrapper and all.
+        request.postproc = counting_postproc
+        start = time.perf_counter()
+        try:
+            response = request.execute(http=http)
+        except HttpError as e:
+            status = 'not_modified' if e.resp.status == 304 else 'error'
+            wire = e.resp.get(WIRE_LENGTH_HEADER)
+            self.record_request(endpoint, time.perf_counter() - start, len(e.content or b''), status,
+                                None if wire is None else int(wire))
+            raise
+        except Exception:
+            self.record_request(endpoint, time.perf_counter() - start, 0, 'error')
+            raise
+        finally:
+            request.postproc = postproc
+        self.record_request(endpoint, time.perf_counter() - start, received[0], 'ok', received[1])
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.cache['hits'] + self.cache['misses']
+            return {
+                'started_at': self.started_at,
+                'endpoints': {name: dict(stats) for name, stats in self.endpoints.items()},
+                'stages': {name: dict(stats) for name, stats in self.stages.items()},
+                'cache': dict(self.cache, hit_rate=self.cache['hits'] / lookups if lookups else None),
+                'quota_by_day': dict(self.quota_by_day),
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix='yt_sorter'):
+        """Renders the counters in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+
+        def family(name, help_text, kind, samples):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            for labels, value in samples:
+                label_str = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f'{prefix}_{name}{{{label_str}}} {value}')
+
+        endpoints = snap['endpoints'].items()
+        family('api_requests_total', 'API requests sent.', 'counter',
+               [({'endpoint': n}, s['requests']) for n, s in endpoints])
+        family('api_pages_total', 'Successful API responses.', 'counter',
+               [({'endpoint': n}, s['pages']) for n, s in endpoints])
+        family('api_not_modified_total', 'Conditional requests answered with 304.', 'counter',
+               [({'endpoint': n}, s['not_modified']) for n, s in endpoints])
+        family('api_errors_total', 'Failed API requests.', 'counter',
+               [({'endpoint': n}, s['errors']) for n, s in endpoints])
+        family('api_request_seconds_total', 'Wall time spent in API requests.', 'counter',
+               [({'endpoint': n}, s['seconds']) for n, s in endpoints])
+        family('api_response_bytes_total', 'Decoded response bytes received.', 'counter',
+               [({'endpoint': n}, s['bytes']) for n, s in endpoints])
+        family('api_wire_bytes_total', 'Response bytes received over the network (compressed).', 'counter',
+               [({'endpoint': n}, s['wire_bytes']) for n, s in endpoints])
+        family('api_quota_units_total', 'Estimated YouTube quota units spent.', 'counter',
+               [({'endpoint': n}, s['quota_units']) for n, s in endpoints])
+        family('quota_units_day', 'Estimated quota units per Pacific-time day.', 'gauge',
+               [({'day': day}, units) for day, units in snap['quota_by_day'].items()])
+        family('stage_runs_total', 'Local processing stage runs.', 'counter',
+               [({'stage': n}, s['runs']) for n, s in snap['stages'].items()])
+        family('stage_seconds_total', 'Time spent in local processing stages.', 'counter',
+               [({'stage': n}, s['seconds']) for n, s in snap['stages'].items()])
+        family('cache_lookups_total', 'Video details cache lookups.', 'counter',
+               [({'result': 'hit'}, snap['cache']['hits']), ({'result': 'miss'}, snap['cache']['misses'])])
+        family('cache_coalesced_total', 'Cache misses answered by another request\'s API call.', 'counter',
+               [({}, snap['cache']['coalesced'])])
+        return '\n'.join(lines) + '\n'
+
+
+def execute(request, metrics=None, http=None):
+    """Executes ``request``, through ``metrics`` when given."""
+    if metrics is None:
+        return request.execute(http=http)
+    return metrics.execute(request, http=http)
+
+
+def stage(metrics, name):
+    """Times a local stage on ``metrics``; a no-op context without one."""
+    return nullcontext() if metrics is None else metrics.stage(name)
@@ -0,0 +1,89 @@
+"""Trigram index for case-insensitive title and channel search.
+
+Each row's casefolded title and channel are split into trigrams once, when
+the frame is built. A query looks up its own trigrams, intersects their
+posting arrays (smallest first) and only then checks the few surviving rows
+for an actual substring match, so a keystroke never scans the whole library.
+"""
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+# Separates title and channel so a match can never span both.
+_SEP = '\x00'
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """Substring search over titles and channels, returning sorted row positions."""
+
+    def __init__(self, titles, channels, cache_size=256):
+        self._texts = [
+            f"{str(title).casefold()}{_SEP}{str(channel).casefold()}"
+            for title, channel in zip(titles, channels)
+        ]
+        postings = {}
+        for pos, text in enumerate(self._texts):
+            for gram in _trigrams(text):
+                postings.setdefault(gram, []).append(pos)
+        self._postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        # Approximate footprint, for memory budgets: postings plus the texts.
+        self.nbytes = (
+            sum(rows.nbytes for rows in self._postings.values())
+            + sum(sys.getsizeof(text) for text in self._texts)
+        )
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df['title'].tolist(), df['channel'].tolist())
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _candidates(self, query):
+        grams = _trigrams(query)
+        if not grams:
+            return None
+        lists = []
+        for gram in grams:
+            rows = self._postings.get(gram)
+            if rows is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(rows)
+        lists.sort(key=len)
+        result = lists[0]
+        for rows in lists[1:]:
+            result = np.intersect1d(result, rows, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+    def search(self, query):
+        """Returns the ascending row positions whose title or channel contains ``query``."""
+        query = query.casefold()
+        if query in self._cache:
+            self._cache.move_to_end(query)
+            return self._cache[query]
+
+        candidates = self._candidates(query)
+        if candidates is None:
+            # Too short for a trigram; a plain scan of the casefolded strings is cheap.
+            result = np.array(
+                [pos for pos, text in enumerate(self._texts) if query in text], dtype=np.int32
+            )
+        else:
+            texts = self._texts
+            result = np.array(
+                [pos for pos in candidates.tolist() if query in texts[pos]], dtype=np.int32
+            )
+
+        self._cache[query] = result
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return result
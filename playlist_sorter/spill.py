@@ -0,0 +1,140 @@
+"""Per-server memory budget for session frames, spilling idle ones to disk.
+
+Every session's videos frame, and whatever is derived from it (search index,
+sort permutations), is registered in one ``FrameStore``. When their total
+size goes over the budget, the least recently used sessions are written to
+uncompressed Arrow IPC files and dropped from memory; the session's next
+``get`` memory-maps its file back. Derived structures are not spilled, they
+are rebuilt from the frame on demand.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pyarrow.feather as feather
+
+DEFAULT_DIR = os.path.join('.cache', 'sessions')
+DEFAULT_IDLE_TTL = 24 * 3600
+
+
+class _Entry:
+    def __init__(self, frame):
+        self.frame = frame
+        self.frame_bytes = int(frame.memory_usage(deep=True).sum())
+        self.derived = {}
+        self.path = None
+        self.touched_at = time.time()
+
+    @property
+    def nbytes(self):
+        if self.frame is None:
+            return 0
+        return self.frame_bytes + sum(getattr(value, 'nbytes', 0) for value in self.derived.values())
+
+
+class FrameStore:
+    """Thread-safe registry of session frames under a shared memory budget."""
+
+    def __init__(self, budget_bytes, directory=DEFAULT_DIR, idle_ttl=DEFAULT_IDLE_TTL):
+        self.budget_bytes = budget_bytes
+        self.directory = directory
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Spill files of an earlier server process belong to sessions that are gone.
+        for name in os.listdir(directory):
+            if name.endswith('.arrow'):
+                os.remove(os.path.join(directory, name))
+
+    def put(self, key, df):
+        """Stores ``df`` as the frame of session ``key``, replacing any earlier one."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._remove_file(old)
+            self._entries[key] = _Entry(df)
+            self._enforce(keep=key)
+
+    def get(self, key):
+        """Returns the frame of session ``key`` (loading it back if spilled), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._touch(key, entry)
+            if entry.frame is None:
+                entry.frame = feather.read_table(entry.path, memory_map=True).to_pandas()
+                self._remove_file(entry)
+                self._enforce(keep=key)
+            return entry.frame
+
+    def derived(self, key, df, name, build):
+        """
+        Returns ``build(df)``, kept with session ``key``'s frame while ``df``
+        is still that frame and it stays in memory.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.frame is df and name in entry.derived:
+                return entry.derived[name]
+        value = build(df)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.frame is df:
+                entry.derived[name] = value
+                self._enforce(keep=key)
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._remove_file(entry)
+
+    def usage(self):
+        """Returns ``{'bytes', 'budget_bytes', 'in_memory', 'spilled'}``."""
+        with self._lock:
+            in_memory = [e for e in self._entries.values() if e.frame is not None]
+            return {
+                'bytes': sum(e.nbytes for e in in_memory),
+                'budget_bytes': self.budget_bytes,
+                'in_memory': len(in_memory),
+                'spilled': len(self._entries) - len(in_memory),
+            }
+
+    def _touch(self, key, entry):
+        entry.touched_at = time.time()
+        self._entries.move_to_end(key)
+
+    def _remove_file(self, entry):
+        if entry.path is not None:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            entry.path = None
+
+    def _spill(self, key, entry):
+        path = os.path.join(self.directory, f'{key}.arrow')
+        # Uncompressed, so reading it back can map the file instead of decoding it.
+        feather.write_feather(entry.frame, path, compression='uncompressed')
+        entry.path = path
+        entry.frame = None
+        entry.derived = {}
+
+    def _enforce(self, keep):
+        """Forgets long-idle sessions, then spills the least recent until under budget."""
+        cutoff = time.time() - self.idle_ttl
+        for key in [k for k, e in self._entries.items() if e.touched_at < cutoff and k != keep]:
+            self._remove_file(self._entries.pop(key))
+
+        total = sum(e.nbytes for e in self._entries.values())
+        for key, entry in list(self._entries.items()):
+            if total <= self.budget_bytes:
+                break
+            if key == keep or entry.frame is None:
+                continue
+            total -= entry.nbytes
+            self._spill(key, entry)
@@ -0,0 +1,246 @@
+"""Incremental playlist sync against the last stored snapshot.
+
+A snapshot keeps the playlist's ETag and the ETag, item IDs and next page
+token of every ``playlistItems`` page, per user: the same playlist ID (such as
+``WL``) can name a different list for everyone. No video details are stored;
+they are resolved through the shared ``VideoCache``, so videos private to one
+user never leave that user's session.
+
+A refresh first asks whether the playlist resource changed at all; an
+unchanged playlist costs that single call. Videos the snapshot already held
+are served from the details cache however old their view counts are (that
+is what "Refresh details" is for), so only added videos, and ones the cache
+does not hold at all, cost ``videos().list`` calls.
+
+When the item count grew, the walk resumes from the last stored page, as long
+as that page still starts with the items it held. Otherwise every page is
+walked with ``If-None-Match``; a page comes back as an empty 304 only if its
+response did not change at all, and every page reports the item count, so
+after items were removed none do.
+
+The playlist ETag tracks the playlist resource, including its item count, so
+a change that adds and removes the same number of items (or, on a grown
+playlist, does so before its last stored page) is only noticed on a full
+resync, which also fetches stale details again.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+
+from googleapiclient.errors import HttpError
+
+from .fetch import DEFAULT_CONCURRENCY, PLAYLIST_ITEM_FIELDS, DetailFetcher, _drain
+from .metrics import execute
+
+DEFAULT_PATH = os.path.join('.cache', 'playlist_snapshots.sqlite3')
+
+Snapshot = namedtuple('Snapshot', 'owner playlist_id playlist_etag pages synced_at')
+SyncResult = namedtuple('SyncResult', 'videos added removed unchanged')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    owner TEXT NOT NULL,
+    playlist_id TEXT NOT NULL,
+    playlist_etag TEXT,
+    pages TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (owner, playlist_id)
+);
+"""
+
+
+class SnapshotStore:
+    """SQLite store of the last synced state of each user's playlists."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] < 1:
+            # Earlier snapshots were shared by playlist ID alone and held every
+            # user's video records, private ones included.
+            self._conn.execute('DROP TABLE IF EXISTS snapshots')
+            self._conn.execute('PRAGMA user_version = 1')
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, owner, playlist_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT playlist_etag, pages, synced_at FROM snapshots WHERE owner = ? AND playlist_id = ?',
+                (owner, playlist_id),
+            ).fetchone()
+        if row is None:
+            return None
+        return Snapshot(owner, playlist_id, row[0], json.loads(row[1]), row[2])
+
+    def put(self, snapshot):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)',
+                (snapshot.owner, snapshot.playlist_id, snapshot.playlist_etag,
+                 json.dumps(snapshot.pages), snapshot.synced_at),
+            )
+            self._conn.commit()
+
+
+def _execute_if_changed(request, etag, metrics=None):
+    """Executes ``request`` conditionally; returns None on 304 Not Modified."""
+    if etag:
+        request.headers['If-None-Match'] = etag
+    try:
+        return execute(request, metrics)
+    except HttpError as e:
+        if e.resp.status == 304:
+            return None
+        raise
+
+
+def _playlist_etag(youtube, playlist_id, etag, metrics=None):
+    """
+    Returns ``(changed, etag, item_count)`` for the playlist resource itself;
+    the item count is None when unchanged or unknown.
+    """
+    response = _execute_if_changed(
+        youtube.playlists().list(part="contentDetails", id=playlist_id,
+                                 fields="etag,items/contentDetails/itemCount"),
+        etag, metrics,
+    )
+    if response is None:
+        return False, etag, None
+    items = response.get('items')
+    if not items:
+        # Special lists such as Watch Later are not returned; treat them as changed.
+        return True, None, None
+    return True, response['etag'], items[0]['contentDetails']['itemCount']
+
+
+def _fetch_page(youtube, playlist_id, token, etag=None, metrics=None):
+    """Returns the page reached through ``token``, or None if ``etag`` still matches it."""
+    response = _execute_if_changed(
+        youtube.playlistItems().list(
+            part="contentDetails",
+            playlistId=playlist_id,
+            maxResults=50,
+            pageToken=token,
+            fields=f"etag,{PLAYLIST_ITEM_FIELDS}",
+        ),
+        etag, metrics,
+    )
+    if response is None:
+        return None
+    return {
+        'token': token,
+        'etag': response['etag'],
+        'ids': [item['contentDetails']['videoId'] for item in response['items']],
+        'next': response.get('nextPageToken'),
+    }
+
+
+def _walk_pages(youtube, playlist_id, old_pages, metrics=None, should_stop=None, grown=False):
+    """
+    Yields the playlist's pages, reusing stored pages the API reports
+    unchanged, until ``should_stop()`` returns true. If the playlist only
+    ``grown``, the walk starts at the last stored page, provided it still
+    starts with the items it held, and the pages before it are reused as stored.
+    """
+    index = 0
+    token = None
+    if grown and old_pages and not (should_stop is not None and should_stop()):
+        last = old_pages[-1]
+        page = _fetch_page(youtube, playlist_id, last['token'], None, metrics)
+        if page['ids'][:len(last['ids'])] == last['ids']:
+            yield from old_pages[:-1]
+            yield page
+            if not page['next']:
+                return
+            index, token = len(old_pages), page['next']
+    while True:
+        if should_stop is not None and should_stop():
+            return
+        old = old_pages[index] if index < len(old_pages) else None
+        # A stored page is only reusable if it was reached through the same token.
+        etag = old['etag'] if old and old['token'] == token else None
+        page = _fetch_page(youtube, playlist_id, token, etag, metrics) or old
+        yield page
+        index += 1
+        token = page['next']
+        if not token:
+            return
+
+
+def iter_sync_playlist(youtube, playlist_id, store, owner, cache=None, on_error=None,
+                       http_factory=None, concurrency=DEFAULT_CONCURRENCY, full=False, metrics=None,
+                       coalescer=None, on_progress=None, should_stop=None):
+    """
+    Brings ``owner``'s stored snapshot of ``playlist_id`` up to date, yielding
+    batches of video records in playlist order as their details come in, and
+    returns a ``SyncResult`` (use ``yield from``, or ``sync_playlist``). The
+    details of every item are resolved through ``cache``: added items need a
+    fresh copy, items already in the snapshot any copy at all, so usually only
+    added items cost ``videos().list`` calls. ``full`` ignores the snapshot,
+    re-walking every page and holding every item to the cache's TTLs, but
+    still reports what changed since it. ``on_progress`` receives
+    the number of playlist items walked so far. ``should_stop()`` is checked
+    before every page; once it returns true the sync ends, leaves the snapshot
+    as it was and returns None.
+    """
+    snapshot = store.get(owner, playlist_id)
+    old_etag = snapshot.playlist_etag if snapshot and not full else None
+
+    previous_ids = [vid for page in snapshot.pages for vid in page['ids']] if snapshot else []
+    # Known videos keep whatever details the cache holds; see "Refresh details".
+    known = set() if full else set(previous_ids)
+
+    changed, playlist_etag, item_count = _playlist_etag(youtube, playlist_id, old_etag, metrics)
+    if snapshot is not None and not changed:
+        pages = iter(snapshot.pages)
+    else:
+        grown = item_count is not None and item_count > len(previous_ids)
+        pages = _walk_pages(youtube, playlist_id, snapshot.pages if snapshot and not full else [],
+                            metrics, should_stop, grown)
+
+    walked, seen, videos = [], set(), []
+    futures = deque()
+    with DetailFetcher(youtube, cache, http_factory, concurrency, metrics, coalescer) as fetcher:
+        for page in pages:
+            if should_stop is not None and should_stop():
+                return None
+            walked.append(page)
+            new_ids = [vid for vid in dict.fromkeys(page['ids']) if vid not in seen]
+            seen.update(new_ids)
+            if new_ids:
+                futures.append(fetcher.submit(new_ids, stale_ok=[vid for vid in new_ids if vid in known]))
+            if on_progress is not None:
+                on_progress(sum(len(p['ids']) for p in walked))
+            for batch in _drain(futures, on_error, block=False):
+                videos.extend(batch)
+                yield batch
+        if should_stop is not None and should_stop():
+            return None
+        for batch in _drain(futures, on_error, block=True):
+            videos.extend(batch)
+            yield batch
+
+    current_ids = list(dict.fromkeys(vid for page in walked for vid in page['ids']))
+    previous = set(previous_ids)
+    added = [vid for vid in current_ids if vid not in previous]
+    removed = [vid for vid in dict.fromkeys(previous_ids) if vid not in seen]
+
+    store.put(Snapshot(owner, playlist_id, playlist_etag, walked, time.time()))
+    return SyncResult(videos, added, removed, not changed or (not added and not removed))
+
+
+def sync_playlist(youtube, playlist_id, store, owner, **kwargs):
+    """Runs ``iter_sync_playlist`` to the end and returns its ``SyncResult``."""
+    batches = iter_sync_playlist(youtube, playlist_id, store, owner, **kwargs)
+    while True:
+        try:
+            next(batches)
+        except StopIteration as done:
+            return done.value
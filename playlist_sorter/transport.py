@@ -0,0 +1,109 @@
+"""Pooled keep-alive HTTP connections that also measure bytes on the wire.
+
+``httplib2.Http`` keeps one persistent connection per host, but a fresh
+``Http`` per fetch (or per worker thread) pays a new TCP and TLS handshake
+each time. ``HttpPool`` hands out ``PooledHttp`` objects and takes them back
+when they are closed, so later fetches, in any session, reuse the warm
+connections. Responses are gzip-compressed (``googleapiclient`` asks for it)
+and ``httplib2`` inflates them before anyone sees the size, so ``PooledHttp``
+counts the compressed bytes read from the socket and reports them in the
+``WIRE_LENGTH_HEADER`` response header. Like ``googleapiclient``'s own
+``build_http``, connections time out (after ``socket.getdefaulttimeout()``,
+or 60 seconds) and 308 responses are not followed as redirects.
+"""
+import socket
+import threading
+
+import httplib2
+from googleapiclient.http import DEFAULT_HTTP_TIMEOUT_SEC
+
+WIRE_LENGTH_HEADER = 'x-wire-length'
+DEFAULT_MAX_IDLE = 16
+
+_wire = threading.local()
+
+
+def _counting_response(response):
+    read = response.read
+
+    def counting_read(*args, **kwargs):
+        data = read(*args, **kwargs)
+        _wire.bytes = getattr(_wire, 'bytes', 0) + len(data)
+        return data
+
+    response.read = counting_read
+    return response
+
+
+class _CountingHTTPConnection(httplib2.HTTPConnectionWithTimeout):
+    def getresponse(self, *args, **kwargs):
+        return _counting_response(super().getresponse(*args, **kwargs))
+
+
+class _CountingHTTPSConnection(httplib2.HTTPSConnectionWithTimeout):
+    def getresponse(self, *args, **kwargs):
+        return _counting_response(super().getresponse(*args, **kwargs))
+
+
+_CONNECTION_TYPES = {'http': _CountingHTTPConnection, 'https': _CountingHTTPSConnection}
+
+
+class PooledHttp(httplib2.Http):
+    """An ``httplib2.Http`` that goes back to its pool on ``close()``."""
+
+    def __init__(self, pool=None, **kwargs):
+        super().__init__(**kwargs)
+        self._pool = pool
+        # The API uses 308 for resumable uploads, not as a redirect.
+        self.redirect_codes = self.redirect_codes - {308}
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        if connection_type is None:
+            connection_type = _CONNECTION_TYPES.get(uri.split(':', 1)[0].lower())
+        _wire.bytes = 0
+        response, content = super().request(uri, method, body, headers, redirections, connection_type)
+        response[WIRE_LENGTH_HEADER] = str(_wire.bytes)
+        return response, content
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            self.discard()
+
+    def discard(self):
+        """Closes the connections for good."""
+        super().close()
+
+
+class HttpPool:
+    """
+    Thread-safe pool of idle keep-alive ``PooledHttp`` objects. ``timeout``
+    is in seconds; by default it is the one ``build_http`` would use.
+    """
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE, timeout=None):
+        self.max_idle = max_idle
+        if timeout is None:
+            timeout = socket.getdefaulttimeout() or DEFAULT_HTTP_TIMEOUT_SEC
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Returns an idle ``PooledHttp``, or a new one; ``close()`` it to give it back."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return PooledHttp(self, timeout=self.timeout)
+
+    def release(self, http):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(http)
+                return
+        http.discard()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._idle)
@@ -0,0 +1,36 @@
+"""Extraction of YouTube video IDs from pasted links and exports.
+
+A single precompiled pattern is run over the whole text, so there is no
+per-token splitting or matching. It recognizes ``watch?v=`` (including
+playlist-item URLs with ``&list=...&index=...``), ``youtu.be/``,
+``/shorts/``, ``/embed/``, ``/live/`` and ``/v/`` links, plus bare
+11-character IDs standing on their own. A bare ID has to follow whitespace or
+list punctuation (the delimiter is part of the match, which keeps the scan
+fast) and must not run into URL punctuation, so path segments, handles and
+playlist IDs are not mistaken for videos.
+"""
+import re
+from collections import namedtuple
+
+VIDEO_ID_RE = re.compile(
+    r"""
+      [?&]v=(?P<v>[\w-]{11})(?![\w-])
+    | youtu\.be/(?P<short>[\w-]{11})(?![\w-])
+    | /(?:shorts|embed|live|v)/(?P<path>[\w-]{11})(?![\w-])
+    | [\s,;"'(\[<|](?P<bare>[\w-]{11})(?=[\s,;"')\]>|]|$)
+    """,
+    re.VERBOSE | re.ASCII,
+)
+
+# ``ids`` in order of first appearance; ``positions[i]`` is the index of
+# ``ids[i]``'s first occurrence among all matches (duplicates included).
+ExtractedIds = namedtuple('ExtractedIds', 'ids positions')
+
+
+def extract_video_ids(text):
+    """Returns the unique video IDs in ``text`` in their original order."""
+    first_seen = {}
+    # The leading newline lets a bare ID at the very start match like any other.
+    for ordinal, groups in enumerate(VIDEO_ID_RE.findall('\n' + text)):
+        first_seen.setdefault(''.join(groups), ordinal)
+    return ExtractedIds(list(first_seen), list(first_seen.values()))
@@ -1,13 +1,69 @@
 import streamlit as st
 import os
+import time
+import uuid
 import pandas as pd
-import isodate
+from contextlib import contextmanager
+from datetime import datetime
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 
+from playlist_sorter.budget import TimeBudget
+from playlist_sorter.cache import DEFAULT_TTLS, VideoCache
+from playlist_sorter.cards import card_html
+from playlist_sorter.coalesce import DetailCoalescer
+from playlist_sorter.durations import format_duration, format_durations
+from playlist_sorter.export import FORMATS as SNAPSHOT_FORMATS, read_snapshot, write_snapshot
+from playlist_sorter.fetch import (
+    fetch_channel_id, fetch_playlists as list_playlists, iter_combined_videos, iter_pasted_videos,
+    iter_playlist_videos
+)
+from playlist_sorter.frames import build_frame, details_fetched_at
+from playlist_sorter.jobs import DONE, QUEUED, RUNNING, JobManager
+from playlist_sorter.metrics import Metrics, QUOTA_TZ
+from playlist_sorter.search import TitleIndex
+from playlist_sorter.sorting import SortedViews
+from playlist_sorter.spill import FrameStore
+from playlist_sorter.transport import HttpPool
+from playlist_sorter.sync import SnapshotStore, iter_sync_playlist
+from playlist_sorter.video_ids import ExtractedIds, extract_video_ids
+
 # --- Configuration ---
 SCOPES = ['https://www.googleapis.com/auth/youtube.readonly']
 
+# Maximum number of videos().list batches in flight at once
+DETAILS_CONCURRENCY = 4
+
+# "Sort by" choices -> (sort key, ascending)
+SORT_OPTIONS = {
+    "Shortest -> Longest": ('duration', True),
+    "Longest -> Shortest": ('duration', False),
+    "Most viewed": ('views', False),
+    "Least viewed": ('views', True),
+    "Channel (A-Z)": ('channel', True),
+    "Channel (Z-A)": ('channel', False),
+    "Title (A-Z)": ('title', True),
+    "Title (Z-A)": ('title', False),
+    "Original order": ('position', True),
+}
+
+# Playlist sync choices -> whether to ignore the stored ETags and re-walk every page
+SYNC_MODES = {"Incremental sync": False, "Full resync": True}
+
+# "Fill my next N minutes" choices -> TimeBudget ranking
+BUDGET_RANKINGS = {"Most views": 'views', "Playlist order": 'position'}
+
+# Seconds between checks on a background fetch for newly arrived videos
+JOB_POLL_SECONDS = 1.0
+
+# Card media: a click-to-load thumbnail, or a live embedded player per card
+CARD_MODES = ["Thumbnails (click to play)", "Live players"]
+
+# Memory for all sessions' videos, search indexes and sort orders together;
+# the least recently used sessions beyond it are spilled to disk
+MEMORY_BUDGET_MB = int(os.environ.get('SORTER_MEMORY_BUDGET_MB', '1024'))
+
 # Allow OAuth over HTTP for local testing
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
@@ -134,99 +190,469 @@ def get_authenticated_service():
 
     return None
 
-def parse_iso_duration(duration_str):
-    try:
-        dur = isodate.parse_duration(duration_str)
-        return dur.total_seconds()
-    except:
-        return 0
-
-def format_duration(seconds):
-    if seconds == 0: return "Live"
-    m, s = divmod(seconds, 60)
-    h, m = divmod(m, 60)
-    if h > 0:
-        return f"{int(h)}:{int(m):02d}:{int(s):02d}"
-    else:
-        return f"{int(m)}:{int(s):02d}"
+@st.cache_resource
+def get_video_cache():
+    """Opens the on-disk video details cache shared by every session."""
+    return VideoCache()
+
+@st.cache_resource
+def get_detail_coalescer():
+    """Merges concurrent sessions' details misses into shared, full API calls."""
+    return DetailCoalescer(get_video_cache())
+
+@st.cache_resource
+def get_snapshot_store():
+    """Opens the on-disk store of every user's last-synced playlist pages, keyed by channel."""
+    return SnapshotStore()
+
+@st.cache_resource
+def get_server_metrics():
+    """Process-wide API and stage metrics; the quota is shared by every session."""
+    return Metrics()
+
+def get_metrics():
+    """Returns this session's metrics, which also feed the server-wide totals."""
+    if 'metrics' not in st.session_state:
+        st.session_state['metrics'] = Metrics(parent=get_server_metrics())
+    return st.session_state['metrics']
 
 def fetch_playlists(youtube):
     """Fetches the user's playlists."""
     playlists = [{'id': 'WL', 'title': 'Watch Later (Default)'}]
     
     try:
-        request = youtube.playlists().list(
-            part="snippet",
-            mine=True,
-            maxResults=50
-        )
-        while request:
-            response = request.execute()
-            for item in response['items']:
-                playlists.append({
-                    'id': item['id'],
-                    'title': item['snippet']['title']
-                })
-            request = youtube.playlists().list_next(request, response)
-            if len(playlists) > 50: break
+        playlists.extend(list_playlists(youtube, metrics=get_metrics()))
     except Exception as e:
         st.error(f"Error fetching playlists: {e}")
         
     return playlists
 
-def fetch_videos(youtube, playlist_id):
-    """Fetches videos from a specific playlist."""
-    videos = []
-    
-    # 1. Get Playlist Items
-    request = youtube.playlistItems().list(
-        part="snippet,contentDetails",
-        playlistId=playlist_id,
-        maxResults=50
-    )
-    
-    status_text = st.empty()
-    status_text.text('Fetching videos...')
-    
-    while request:
+@st.cache_resource
+def get_http_pool():
+    """Keep-alive connections to the API, reused by every fetch of every session."""
+    return HttpPool()
+
+def get_http_factory():
+    """Returns a factory of pooled authorized connections for worker threads."""
+    credentials = st.session_state['credentials']
+    return lambda: AuthorizedHttp(credentials, http=get_http_pool().acquire())
+
+def get_channel_id():
+    """
+    The signed-in user's channel ID, which keys their playlist snapshots;
+    looked up once per sign-in. None if they have no channel or it failed.
+    """
+    credentials = st.session_state['credentials']
+    cached = st.session_state.get('channel_id')
+    if cached is None or cached[0] is not credentials:
         try:
-            response = request.execute()
+            channel_id = fetch_channel_id(get_service(), metrics=get_metrics())
         except Exception as e:
-            st.error(f"Error fetching playlist items: {e}")
-            return []
+            st.warning(f"Could not look up your channel; fetching without sync snapshots: {e}")
+            channel_id = None
+        cached = (credentials, channel_id)
+        st.session_state['channel_id'] = cached
+    return cached[1]
 
-        # We need to fetch video details to get duration (contentDetails)
-        video_ids = [item['contentDetails']['videoId'] for item in response['items']]
-        
-        if video_ids:
-            try:
-                vid_request = youtube.videos().list(
-                    part="snippet,contentDetails,statistics",
-                    id=",".join(video_ids)
-                )
-                vid_response = vid_request.execute()
-                
-                for item in vid_response['items']:
-                    dur_sec = parse_iso_duration(item['contentDetails'].get('duration', 'PT0S'))
-                    videos.append({
-                        'id': item['id'],
-                        'title': item['snippet']['title'],
-                        'thumbnail': item['snippet']['thumbnails'].get('medium', {}).get('url', ''),
-                        'channel': item['snippet']['channelTitle'],
-                        'duration_sec': dur_sec,
-                        'duration_fmt': format_duration(dur_sec),
-                        'view_count': int(item['statistics'].get('viewCount', 0))
-                    })
-            except Exception as e:
-                st.warning(f"Could not fetch details for batch: {e}")
+def get_service():
+    """
+    The session's API client, built once per sign-in so reruns skip the
+    discovery build and keep its main-thread connection warm.
+    """
+    credentials = st.session_state['credentials']
+    cached = st.session_state.get('service')
+    if cached is None or cached[0] is not credentials:
+        http = AuthorizedHttp(credentials, http=get_http_pool().acquire())
+        cached = (credentials, build('youtube', 'v3', http=http))
+        st.session_state['service'] = cached
+    return cached[1]
 
-        request = youtube.playlistItems().list_next(request, response)
-        status_text.text(f"Fetched {len(videos)} videos so far...")
-        if len(videos) > 200: # Safety break
-            break
-    
-    status_text.empty()
-    return videos
+def fetch_options():
+    """Resources a background fetch needs, resolved on the script thread."""
+    return dict(
+        cache=get_video_cache(),
+        http_factory=get_http_factory(),
+        concurrency=DETAILS_CONCURRENCY,
+        metrics=get_metrics(),
+        coalescer=get_detail_coalescer()
+    )
+
+@contextmanager
+def job_service(http_factory):
+    """A client of the job's own: the session's client belongs to the script thread."""
+    http = http_factory()
+    try:
+        yield build('youtube', 'v3', http=http)
+    finally:
+        http.close()
+
+def fetch_videos(playlist_id, options):
+    """Returns a job fetch streaming batches of a playlist's videos, in playlist order."""
+    def fetch(job):
+        with job_service(options['http_factory']) as youtube:
+            yield from iter_playlist_videos(
+                youtube, playlist_id, on_error=job.on_error, on_progress=job.on_progress,
+                should_stop=job.should_stop, **options
+            )
+    return fetch
+
+def fetch_combined(labels, options):
+    """Returns a job fetch streaming the union of several playlists (`labels` maps their IDs to titles)."""
+    def fetch(job):
+        with job_service(options['http_factory']) as youtube:
+            yield from iter_combined_videos(
+                youtube, list(labels), labels=labels,
+                on_error=job.on_error, on_progress=job.on_progress,
+                should_stop=job.should_stop, **options
+            )
+    return fetch
+
+def fetch_pasted(extracted, options):
+    """Returns a job fetch streaming the details of pasted (or reloaded) video IDs."""
+    def fetch(job):
+        with job_service(options['http_factory']) as youtube:
+            yield from iter_pasted_videos(youtube, extracted, on_error=job.on_error, **options)
+    return fetch
+
+def refresh_videos(df, options):
+    """
+    Returns a job fetch streaming fresh details for the videos of `df`, keeping
+    their positions and, in combined views, the playlists holding them.
+    """
+    by_position = df.sort_values('position')
+    extracted = ExtractedIds(by_position['id'].tolist(), by_position['position'].tolist())
+    playlists_of = dict(zip(df['id'], df['playlists'].tolist())) if 'playlists' in df else None
+    def fetch(job):
+        with job_service(options['http_factory']) as youtube:
+            for batch in iter_pasted_videos(youtube, extracted, on_error=job.on_error, **options):
+                if playlists_of is not None:
+                    batch = [dict(record, playlists=playlists_of[record['id']]) for record in batch]
+                yield batch
+    return fetch
+
+def sync_videos(playlist_id, store, owner, options, full=False):
+    """
+    Returns a job fetch that syncs `owner`'s snapshot of a playlist, streaming
+    its videos; `full` re-walks every page and refetches stale details instead
+    of trusting the snapshot.
+    """
+    def fetch(job):
+        with job_service(options['http_factory']) as youtube:
+            result = yield from iter_sync_playlist(
+                youtube, playlist_id, store, owner, full=full,
+                on_error=job.on_error, on_progress=job.on_progress,
+                should_stop=job.should_stop, **options
+            )
+        if result is None:
+            return
+        if full:
+            job.note(f"Resynced: {len(result.added)} added, {len(result.removed)} removed since the last sync.")
+        elif result.unchanged:
+            job.note("Playlist unchanged since the last sync.")
+        else:
+            job.note(f"Synced: {len(result.added)} added, {len(result.removed)} removed since the last sync.")
+    return fetch
+
+def render_video_cards(current_df, start_idx=0, card_mode=None):
+    """Renders one page of videos as a three-column grid of cards, one markdown block per column."""
+    card_mode = card_mode or st.session_state.get('card_mode', CARD_MODES[0])
+    columns = [[], [], []]
+    for pos, row in enumerate(current_df.to_dict('records')):
+        duration_sec = row['duration_sec']
+        head, tail = card_html(
+            row['id'], row['title'], row['channel'],
+            None if pd.isna(duration_sec) else int(duration_sec), row['duration_status'],
+            row.get('playlists'), facade=card_mode == CARD_MODES[0]
+        )
+        columns[pos % 3].append(f"{head}{start_idx + pos + 1}{tail}")
+    for col, cards in zip(st.columns(3), columns):
+        with col:
+            st.markdown("".join(cards), unsafe_allow_html=True)
+
+@st.cache_resource
+def get_job_manager():
+    """Runs every session's fetches off the script thread, so reruns don't lose them."""
+    return JobManager()
+
+def start_job(source, label, fetch, sort_order, empty_message):
+    """
+    Runs `fetch` in the background as this session's fetch of `source`. Its
+    videos replace the session's as they arrive, starting out sorted by
+    `sort_order`; an earlier fetch still running for another source is cancelled.
+    """
+    key = (session_key(), source)
+    active = st.session_state.get('job')
+    if active is not None and active['key'] != key:
+        get_job_manager().discard(active['key'])
+    get_job_manager().submit(key, fetch, label)
+    st.session_state['job'] = {'key': key, 'sort': sort_order, 'merged': 0, 'empty': empty_message}
+
+def cancel_job():
+    """Stops this session's running fetch, if any, keeping what it has loaded."""
+    active = st.session_state.pop('job', None)
+    if active is not None:
+        get_job_manager().discard(active['key'])
+
+def merge_job():
+    """
+    Brings batches of this session's fetch that arrived since the last run
+    into its videos frame. Once the fetch is over, reports how it went and
+    forgets it. Returns the job while it is still running, else None.
+    """
+    active = st.session_state.get('job')
+    if active is None:
+        return None
+    job = get_job_manager().get(active['key'])
+    if job is None:
+        st.session_state.pop('job')
+        return None
+
+    progress = job.progress()
+    if progress.batches > active['merged']:
+        records = job.records()
+        # Cached details may be older than the job
+        fetched_at = details_fetched_at(records, default=job.started_at)
+        with get_metrics().stage('build'):
+            df = build_frame(records)
+        if active['merged'] == 0:
+            start_dataset(df, active['sort'], fetched_at=fetched_at)
+        else:
+            # Later batches keep the view the user is browsing
+            set_videos_df(df, fetched_at)
+        active['merged'] = progress.batches
+
+    if progress.state in (QUEUED, RUNNING):
+        return job
+
+    if progress.error is not None:
+        st.error(f"Could not fetch {job.label}: {progress.error}")
+    elif progress.videos == 0 and progress.state == DONE:
+        st.warning(active['empty'])
+    if progress.errors:
+        st.warning(f"Could not fetch details for {len(progress.errors)} batches: {progress.errors[0]}")
+    if progress.message:
+        st.caption(progress.message)
+    get_job_manager().discard(active['key'])
+    st.session_state.pop('job')
+    return None
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_job_progress(job):
+    """
+    Shows the running fetch's progress, polling on its own; the whole script
+    reruns only once new batches are in, to show them.
+    """
+    progress = job.progress()
+    merged = st.session_state.get('job', {}).get('merged', 0)
+    if progress.batches > merged or not job.running:
+        st.rerun()
+
+    col_status, col_cancel = st.columns([4, 1])
+    with col_status:
+        if progress.state == QUEUED:
+            st.caption(f"Waiting to fetch {job.label}...")
+        else:
+            walked = f" ({progress.walked} playlist items walked)" if progress.walked else ""
+            st.caption(progress.message or f"Fetching {job.label}: {progress.videos} videos loaded so far{walked}. "
+                                           "You can browse them while the rest arrive.")
+    with col_cancel:
+        st.button("Cancel fetch", key="cancel_job", on_click=job.cancel)
+
+def render_performance_panel():
+    """Shows API latency, bytes and quota next to local stage timings."""
+    snap = get_metrics().snapshot()
+    server = get_server_metrics().snapshot()
+    today = datetime.now(QUOTA_TZ).date().isoformat()
+
+    with st.expander("Performance"):
+        col_q1, col_q2, col_q3 = st.columns(3)
+        col_q1.metric("Quota units (this session)", sum(s['quota_units'] for s in snap['endpoints'].values()))
+        col_q2.metric("Quota units today (server)", server['quota_by_day'].get(today, 0))
+        hit_rate = snap['cache']['hit_rate']
+        col_q3.metric("Details cache hit rate", "–" if hit_rate is None else f"{hit_rate:.0%}")
+        if snap['cache']['coalesced']:
+            st.caption(f"{snap['cache']['coalesced']} cache misses were answered by another session's API call.")
+        memory = get_frame_store().usage()
+        st.caption(
+            f"Session data in memory (server): {memory['bytes'] / 2**20:.1f} of {memory['budget_bytes'] / 2**20:.0f} MB "
+            f"across {memory['in_memory']} sessions; {memory['spilled']} idle sessions spilled to disk."
+        )
+
+        st.markdown("**API requests**")
+        if snap['endpoints']:
+            api = pd.DataFrame.from_dict(snap['endpoints'], orient='index')
+            api['avg_ms'] = api['seconds'] / api['requests'] * 1000
+            api['kb'] = api['bytes'] / 1024
+            api['wire_kb'] = api['wire_bytes'] / 1024
+            api['kb_per_page'] = api['kb'] / api['pages'].where(api['pages'] > 0)
+            st.dataframe(api[['requests', 'pages', 'not_modified', 'errors', 'avg_ms', 'seconds',
+                              'kb', 'wire_kb', 'kb_per_page', 'quota_units']])
+        else:
+            st.caption("No API requests yet.")
+
+        st.markdown("**Local stages**")
+        if snap['stages']:
+            stages = pd.DataFrame.from_dict(snap['stages'], orient='index')
+            stages[['last_ms', 'max_ms']] = stages[['last', 'max']] * 1000
+            st.dataframe(stages[['runs', 'seconds', 'last_ms', 'max_ms']])
+        else:
+            st.caption("Nothing timed yet.")
+
+        col_e1, col_e2, col_e3 = st.columns(3)
+        with col_e1:
+            st.download_button("Export JSON", get_metrics().to_json(), "metrics.json", "application/json")
+        with col_e2:
+            st.download_button("Export Prometheus", get_metrics().to_prometheus(), "metrics.prom", "text/plain")
+        with col_e3:
+            if st.button("Reset session metrics"):
+                get_metrics().reset()
+                st.rerun()
+
+@st.cache_resource
+def get_frame_store():
+    """Holds every session's videos under one memory budget, spilling idle ones."""
+    return FrameStore(MEMORY_BUDGET_MB * 2**20)
+
+def session_key():
+    if 'session_key' not in st.session_state:
+        st.session_state['session_key'] = uuid.uuid4().hex
+    return st.session_state['session_key']
+
+def get_videos_df():
+    """Returns this session's videos frame, or None before anything was loaded."""
+    return get_frame_store().get(session_key())
+
+def set_videos_df(df, fetched_at=None):
+    """Replaces this session's videos; `fetched_at` is when their details were fetched, if known."""
+    get_frame_store().put(session_key(), df)
+    st.session_state['fetched_at'] = fetched_at
+
+def start_dataset(df, sort_order, fetched_at=None):
+    """Makes `df` the session's videos and resets the view to `sort_order`."""
+    set_videos_df(df, fetched_at)
+    st.session_state['current_sort'] = sort_order
+    st.session_state['current_page'] = 0  # Reset page on new fetch
+    st.session_state.pop('duration_range', None)  # Bounds depend on the data
+
+def format_age(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} min"
+    if minutes < 48 * 60:
+        return f"{minutes // 60} h"
+    return f"{minutes // (24 * 60)} days"
+
+def _per_dataset(name, df, build):
+    """Returns `build(df)`, kept with the session's frame until it is replaced or spilled."""
+    return get_frame_store().derived(session_key(), df, name, build)
+
+def get_title_index(df):
+    """Returns the search index for `df`, building it the first time `df` is searched."""
+    with get_metrics().stage('search'):
+        return _per_dataset('title_index', df, TitleIndex.from_frame)
+
+def get_sorted_views(df):
+    """Returns the precomputed sort permutations for `df`."""
+    with get_metrics().stage('sort'):
+        return _per_dataset('sorted_views', df, SortedViews)
+
+def get_time_budget(df):
+    """Returns the sorted durations and prefix sums for `df`'s time-budget queries."""
+    with get_metrics().stage('budget'):
+        return _per_dataset('time_budget', df, TimeBudget)
+
+@st.fragment
+def render_time_budget(df, card_mode):
+    """
+    Answers "what fits in my next N minutes" for the whole library with binary
+    searches and a small knapsack; changing the inputs reruns only this.
+    """
+    col_m, col_r = st.columns([1, 2])
+    with col_m:
+        minutes = st.number_input("Minutes available", min_value=1, max_value=24 * 60, value=30, step=5, key="budget_minutes")
+    with col_r:
+        ranking = st.radio("Pick the best set by", list(BUDGET_RANKINGS), horizontal=True, key="budget_ranking")
+    seconds = int(minutes) * 60
+
+    budget = get_time_budget(df)
+    with get_metrics().stage('budget'):
+        shorter = budget.at_most(seconds)
+        fit = budget.fit(seconds)
+        best = budget.best_set(seconds, BUDGET_RANKINGS[ranking])
+
+    col_1, col_2, col_3 = st.columns(3)
+    col_1.metric(f"Videos up to {minutes} min", len(shorter))
+    col_2.metric("Most that fit back to back", fit.count,
+                 help=f"The {fit.count} shortest videos, {format_duration(fit.seconds)} in total.")
+    col_3.metric("Best set", len(best.positions),
+                 help=f"{format_duration(best.seconds)} of your {minutes} min.")
+    if not len(best.positions):
+        st.caption("Nothing in this library fits that time.")
+        return
+    if BUDGET_RANKINGS[ranking] == 'views':
+        st.caption(f"The {len(best.positions)} videos with the most views between them ({best.value:,}) "
+                   f"that fit: {format_duration(best.seconds)} in total.")
+    else:
+        st.caption(f"In playlist order, every next video that still fits: {format_duration(best.seconds)} in total.")
+    with get_metrics().stage('render'):
+        render_video_cards(df.iloc[best.positions], 0, card_mode)
+    st.write("---")
+
+def go_to_page(page):
+    st.session_state['current_page'] = page
+
+def render_page_nav(current_page, total_pages, where):
+    """Previous / Next buttons; their callbacks turn the page before the grid reruns."""
+    col_nav1, col_nav2, col_nav3 = st.columns([1, 2, 1])
+    with col_nav1:
+        st.button("Previous", key=f"prev_{where}", disabled=(current_page == 0),
+                  on_click=go_to_page, args=(current_page - 1,))
+    with col_nav2:
+        st.markdown(f"<div style='text-align: center; padding-top: 10px;'>Page {current_page + 1} of {total_pages}</div>", unsafe_allow_html=True)
+    with col_nav3:
+        st.button("Next", key=f"next_{where}", disabled=(current_page >= total_pages - 1),
+                  on_click=go_to_page, args=(current_page + 1,))
+
+@st.fragment
+def render_results(df, order, sort_order, items_per_page, card_mode):
+    """
+    One page of the selected videos (`order` is their permutation of `df`)
+    with its pagination. A page flip reruns only this fragment, not the
+    search, sort and tabs above it.
+    """
+    total_videos = len(order)
+    total_pages = max(1, (total_videos - 1) // items_per_page + 1)
+
+    # Ensure current_page is valid
+    if st.session_state['current_page'] >= total_pages:
+        st.session_state['current_page'] = max(0, total_pages - 1)
+
+    current_page = st.session_state['current_page']
+    start_idx = current_page * items_per_page
+    end_idx = min(start_idx + items_per_page, total_videos)
+
+    # Slice the permutation, then take just those rows
+    current_df = df.iloc[order[start_idx:end_idx]]
+
+    st.success(f"Found {total_videos} videos. Showing {min(start_idx + 1, end_idx)}-{end_idx} ({sort_order}).")
+
+    # Navigation Controls (Top)
+    render_page_nav(current_page, total_pages, 'top')
+
+    # Debug / List View
+    with st.expander("View as List (Debug)"):
+        st.dataframe(
+            current_df.assign(duration_fmt=format_durations(current_df))
+            [['title', 'duration_fmt', 'duration_sec', 'channel']]
+        )
+
+    # Grid Layout
+    with get_metrics().stage('render'):
+        render_video_cards(current_df, start_idx, card_mode)
+
+    # Navigation Controls (Bottom - for convenience)
+    st.write("---")
+    render_page_nav(current_page, total_pages, 'bottom')
 
 # --- Main App Interface ---
 
@@ -276,35 +702,67 @@ else:
     with col2:
          if st.button("Sign Out / Reset"):
             st.session_state.pop('credentials', None)
-            st.session_state.pop('videos_df', None)
+            st.session_state.pop('service', None)
+            st.session_state.pop('channel_id', None)
+            cancel_job()
+            get_frame_store().discard(session_key())
             st.rerun()
 
-    service = build('youtube', 'v3', credentials=st.session_state['credentials'])
+    service = get_service()
     
     # Tabs for different input methods
-    tab1, tab2 = st.tabs(["📺 API Fetch (Playlists)", "📋 Paste Video IDs"])
+    tab1, tab2, tab3 = st.tabs(["📺 API Fetch (Playlists)", "📋 Paste Video IDs", "📦 Import Snapshot"])
     
     with tab1:
         # Playlist Selector
         playlists = fetch_playlists(service)
         playlist_options = {p['title']: p['id'] for p in playlists}
         
+        combine = st.checkbox("Combine several playlists into one list", key="combine_playlists")
+        
         col_a, col_b = st.columns([2, 1])
         with col_a:
-            selected_playlist_name = st.selectbox("Select a Playlist", options=list(playlist_options.keys()))
-            selected_playlist_id = playlist_options[selected_playlist_name]
+            if combine:
+                # Watch Later is left out by default: the API returns it empty
+                combined_names = st.multiselect(
+                    "Playlists to combine", options=list(playlist_options.keys()),
+                    default=[name for name, pid in playlist_options.items() if pid != 'WL']
+                )
+            else:
+                selected_playlist_name = st.selectbox("Select a Playlist", options=list(playlist_options.keys()))
+                selected_playlist_id = playlist_options[selected_playlist_name]
         with col_b:
             sort_order_1 = st.radio("Sort Order", ["Shortest -> Longest", "Longest -> Shortest"], key="sort1")
 
-        if st.button("Fetch & Sort Playlist"):
-            data = fetch_videos(service, selected_playlist_id)
-            if data:
-                df = pd.DataFrame(data)
-                st.session_state['videos_df'] = df
-                st.session_state['current_sort'] = sort_order_1
-                st.session_state['current_page'] = 0  # Reset page on new fetch
+        if not combine:
+            sync_mode = st.radio(
+                "Sync", list(SYNC_MODES), horizontal=True, key="sync_mode",
+                help="Incremental sync only walks what changed since the last fetch and only fetches "
+                     "details of added videos (use \"Refresh details\" for fresh view counts), but misses "
+                     "a change that adds and removes the same number of videos; a full resync re-walks "
+                     "every page and refetches whatever details have gone stale."
+            )
+
+        if combine:
+            if st.button("Fetch & Combine Playlists", disabled=not combined_names):
+                labels = {playlist_options[name]: name for name in combined_names}
+                start_job(
+                    ('combined',) + tuple(sorted(labels)), f"{len(labels)} playlists",
+                    fetch_combined(labels, fetch_options()), sort_order_1,
+                    "No videos found in the selected playlists."
+                )
+        elif st.button("Fetch & Sort Playlist"):
+            owner = get_channel_id()
+            if owner is not None:
+                fetch = sync_videos(selected_playlist_id, get_snapshot_store(), owner, fetch_options(),
+                                    full=SYNC_MODES[sync_mode])
             else:
-                st.warning(f"No videos found in '{selected_playlist_name}'. If this is 'Watch Later', the API is likely blocked. Please try the 'Paste Video IDs' tab instead.")
+                # Without a channel there is nothing to key a snapshot by
+                fetch = fetch_videos(selected_playlist_id, fetch_options())
+            start_job(
+                ('playlist', selected_playlist_id), f"'{selected_playlist_name}'", fetch, sort_order_1,
+                f"No videos found in '{selected_playlist_name}'. If this is 'Watch Later', the API is likely blocked. Please try the 'Paste Video IDs' tab instead."
+            )
 
     with tab2:
         st.markdown("""
@@ -322,202 +780,138 @@ else:
         sort_order_2 = st.radio("Sort Order", ["Shortest -> Longest", "Longest -> Shortest"], key="sort2")
         
         if st.button("Process Pasted Videos"):
-            # Extract IDs using simple regex
-            import re
-            # Matches youtube.com/watch?v=ID or youtu.be/ID or just ID (11 chars)
-            # We'll look for 11 char strings that look like IDs if flexible, 
-            # but picking out URL patterns is safer.
-            video_ids = []
-            
-            # Simple splitter
-            tokens = pasted_text.split()
-            for token in tokens:
-                # Try to find ?v=...
-                match = re.search(r'v=([a-zA-Z0-9_-]{11})', token)
-                if match:
-                    video_ids.append(match.group(1))
-                    continue
-                # Try short url
-                match = re.search(r'youtu\.be/([a-zA-Z0-9_-]{11})', token)
-                if match:
-                    video_ids.append(match.group(1))
-                    continue
+            # One pass over the whole paste; duplicates dropped, original order kept
+            extracted = extract_video_ids(pasted_text)
+            video_ids = extracted.ids
             
             if not video_ids:
                 st.error("No valid YouTube video IDs found in the text.")
             else:
-                # Remove duplicates
-                video_ids = list(set(video_ids))
                 st.info(f"Found {len(video_ids)} unique video IDs. Fetching details...")
                 
-                # Fetch details manually
-                videos = []
-                batch_size = 50
-                for i in range(0, len(video_ids), batch_size):
-                    batch = video_ids[i:i+batch_size]
-                    try:
-                        vid_request = service.videos().list(
-                            part="snippet,contentDetails,statistics",
-                            id=",".join(batch)
-                        )
-                        vid_response = vid_request.execute()
-                        for item in vid_response['items']:
-                            dur_sec = parse_iso_duration(item['contentDetails'].get('duration', 'PT0S'))
-                            videos.append({
-                                'id': item['id'],
-                                'title': item['snippet']['title'],
-                                'thumbnail': item['snippet']['thumbnails'].get('medium', {}).get('url', ''),
-                                'channel': item['snippet']['channelTitle'],
-                                'duration_sec': dur_sec,
-                                'duration_fmt': format_duration(dur_sec),
-                                'view_count': int(item['statistics'].get('viewCount', 0))
-                            })
-                    except Exception as e:
-                        st.error(f"Error fetching batch: {e}")
-                
-                if videos:
-                    df = pd.DataFrame(videos)
-                    st.session_state['videos_df'] = df
-                    st.session_state['current_sort'] = sort_order_2
-                    st.session_state['current_page'] = 0  # Reset page on new fetch
-                else:
-                    st.error("Could not fetch video details.")
+                # Fetch details, reusing anything already cached; each record
+                # keeps where its ID sat in the paste, for "Original order"
+                start_job(
+                    ('pasted',), "the pasted videos", fetch_pasted(extracted, fetch_options()),
+                    sort_order_2, "Could not fetch video details."
+                )
 
 
-    if 'videos_df' in st.session_state:
-        df = st.session_state['videos_df']
-        
-        # Determine sort order
-        # Fallback to whatever was last set or default
-        sort_order = st.session_state.get('current_sort', "Shortest -> Longest")
+    with tab3:
+        st.markdown("Reload a library exported below (or written by `python -m playlist_sorter`) without any API calls.")
+        uploaded = st.file_uploader("Snapshot file (Parquet or Arrow)", type=['parquet', 'arrow'])
+        sort_order_3 = st.radio("Sort Order", ["Shortest -> Longest", "Longest -> Shortest"], key="sort3")
+
+        if st.button("Load Snapshot", disabled=uploaded is None):
+            try:
+                with get_metrics().stage('import'):
+                    snapshot = read_snapshot(uploaded)
+            except Exception as e:
+                st.error(f"Could not read snapshot: {e}")
+            else:
+                cancel_job()
+                start_dataset(snapshot.frame, sort_order_3, snapshot.fetched_at)
+                get_sorted_views(snapshot.frame)
+
+    job = merge_job()
+    if job is not None:
+        render_job_progress(job)
+
+    df = get_videos_df()
+    if df is not None:
         
+        # --- Snapshot Age & Export ---
+        fetched_at = st.session_state.get('fetched_at')
+        col_age, col_refresh, col_parquet, col_arrow = st.columns([3, 1, 1, 1])
+        with col_age:
+            if fetched_at is None:
+                st.caption("Details fetched at an unknown time; view counts may be out of date.")
+            elif time.time() - fetched_at > DEFAULT_TTLS['statistics']:
+                st.caption(f"Details fetched {format_age(time.time() - fetched_at)} ago; view counts may be out of date.")
+            else:
+                st.caption(f"Details fetched {format_age(time.time() - fetched_at)} ago.")
+        with col_refresh:
+            refresh = st.button("Refresh details")
+        for col, fmt in ((col_parquet, 'parquet'), (col_arrow, 'arrow')):
+            extension, mime = SNAPSHOT_FORMATS[fmt]
+            with col:
+                st.download_button(
+                    f"Export {fmt.title()}",
+                    # Serialized only when clicked, off the script thread
+                    data=lambda df=df, fmt=fmt: write_snapshot(df, fmt, fetched_at),
+                    file_name=f"videos_snapshot.{extension}", mime=mime,
+                    on_click='ignore'
+                )
+        if refresh:
+            # Re-request only what the details cache holds no fresh copy of
+            start_job(
+                ('refresh',), "fresh details", refresh_videos(df, fetch_options()),
+                st.session_state['current_sort'], "Could not fetch video details."
+            )
+            st.rerun()  # To show its progress above
         
-        # --- Search & Sort Controls ---
+        # --- Search, Sort & Filter Controls ---
         col_search, col_sort = st.columns([3, 1])
         with col_search:
-            search_query = st.text_input("Search Videos", placeholder="Filter by title...", key="search_query")
-        
-        # Apply Search Filter
-        if search_query:
-            # Case-insensitive containment check
-            df = df[df['title'].str.contains(search_query, case=False, na=False)]
-            
-            # Reset pagination if search changes (handled by session state or simple logic)
-            # We need to detect if search changed. A simple way is to check if the filtered length
-            # is different or just reset to 0 if we change the query.
-            # However, since streamlit reruns on input change, we can just check a stored previous query.
-            if st.session_state.get('last_search_query') != search_query:
-                st.session_state['current_page'] = 0
-                st.session_state['last_search_query'] = search_query
-        
-        # Apply Sort (on filtered or full df)
-        ascending = (sort_order == "Shortest -> Longest")
-        df = df.sort_values(by='duration_sec', ascending=ascending).reset_index(drop=True)
+            search_query = st.text_input("Search Videos", placeholder="Filter by title or channel...", key="search_query")
+        with col_sort:
+            # Defaults to the order picked when the videos were fetched
+            sort_order = st.selectbox("Sort by", list(SORT_OPTIONS), key="current_sort")
+        sort_key, ascending = SORT_OPTIONS[sort_order]
 
-        
-        # --- Pagination Logic ---
         if 'current_page' not in st.session_state:
             st.session_state['current_page'] = 0
             
-        col_p1, col_p2 = st.columns([1, 3])
+        col_p1, col_p2, col_p3 = st.columns([1, 1, 2])
         with col_p1:
-            items_per_page = st.selectbox("Videos per page", [10, 20, 50, 100], index=0)
-        
-        total_videos = len(df)
-        total_pages = (total_videos - 1) // items_per_page + 1
-        
-        # Ensure current_page is valid
-        if st.session_state['current_page'] >= total_pages:
-            st.session_state['current_page'] = max(0, total_pages - 1)
-            
-        current_page = st.session_state['current_page']
-        start_idx = current_page * items_per_page
-        end_idx = min(start_idx + items_per_page, total_videos)
-        
-        # Slice the dataframe
-        current_df = df.iloc[start_idx:end_idx]
-        
-        st.success(f"Found {total_videos} videos. Showing {start_idx + 1}-{end_idx} ({sort_order}).")
-        
-        # Navigation Controls (Top)
-        col_nav1, col_nav2, col_nav3 = st.columns([1, 2, 1])
-        with col_nav1:
-            if st.button("Previous", disabled=(current_page == 0)):
-                st.session_state['current_page'] -= 1
-                st.rerun()
-        with col_nav2:
-             st.markdown(f"<div style='text-align: center; padding-top: 10px;'>Page {current_page + 1} of {total_pages}</div>", unsafe_allow_html=True)
-        with col_nav3:
-            if st.button("Next", disabled=(current_page >= total_pages - 1)):
-                st.session_state['current_page'] += 1
-                st.rerun()
+            items_per_page = st.selectbox("Videos per page", [10, 20, 50, 100], index=0, key="items_per_page")
+        with col_p2:
+            card_mode = st.selectbox("Cards", CARD_MODES, key="card_mode")
+        with col_p3:
+            longest = df['duration_sec'].max()
+            if pd.isna(longest):
+                # Only live streams or unknown durations: nothing to filter on
+                st.caption("No video here has a known duration.")
+                min_sec = max_sec = None
+            else:
+                max_minutes = max(1, -(-int(longest) // 60))
+                previous_max = st.session_state.get('duration_max')
+                if 'duration_range' not in st.session_state:
+                    st.session_state['duration_range'] = (0, max_minutes)
+                elif previous_max != max_minutes:
+                    # Longer videos streamed in: an upper bound left at the end follows it
+                    low, high = st.session_state['duration_range']
+                    high = max_minutes if high == previous_max else min(high, max_minutes)
+                    st.session_state['duration_range'] = (min(low, high), high)
+                st.session_state['duration_max'] = max_minutes
+                min_len, max_len = st.slider("Duration (minutes)", 0, max_minutes, key="duration_range")
+                min_sec = min_len * 60 if min_len > 0 else None
+                max_sec = max_len * 60 if max_len < max_minutes else None
 
-        # Debug / List View
-        with st.expander("View as List (Debug)"):
-            st.dataframe(current_df[['title', 'duration_fmt', 'duration_sec', 'channel']])
+        # Apply Search Filter: case-insensitive containment, answered from the trigram index.
+        # The index is only built once there is something to search: a streaming
+        # fetch replaces the frame on every poll.
+        positions = None
+        if search_query:
+            index = get_title_index(df)
+            with get_metrics().stage('search'):
+                positions = index.search(search_query)
 
-        # Grid Layout
-        # We use native columns now to support embedded players
-        
-        # CSS to style the native columns like cards
-        st.markdown("""
-        <style>
-            /* Removed previous card styling hack since we are building full custom cards now */
+        # Apply Sort & Duration Range as a slice of the precomputed permutation
+        views = get_sorted_views(df)
+        with get_metrics().stage('sort'):
+            order = views.select(sort_key, ascending, positions, min_sec, max_sec)
 
-        </style>
-        """, unsafe_allow_html=True)
-        
-        cols = st.columns(3)
+        # Reset pagination whenever the selection itself changes
+        view_key = (search_query, sort_order, min_sec, max_sec)
+        if st.session_state.get('last_view_key') != view_key:
+            st.session_state['current_page'] = 0
+            st.session_state['last_view_key'] = view_key
         
-        cols = st.columns(3)
-        for idx, row in current_df.iterrows():
-            with cols[idx % 3]:
-                # st.video replacement with custom iframe for better tracking support
-                # enablejsapi=1 and origin are key for tracking
-                video_url = f"https://www.youtube.com/embed/{row['id']}?enablejsapi=1&origin=http://localhost:8501"
-                
-                st.markdown(f"""
-                <div class="video-card">
-                    <iframe 
-                        width="100%" 
-                        height="200" 
-                        src="{video_url}" 
-                        title="YouTube video player" 
-                        frameborder="0" 
-                        allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share" 
-                        allowfullscreen
-                        style="border-radius: 10px 10px 0 0;">
-                    </iframe>
-                    <div class="video-content">
-                        <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:0.5rem;">
-                            <span class="duration-badge">{row['duration_fmt']}</span>
-                            <span class="video-meta" title="{row['duration_sec']} sec">#{start_idx + idx + 1}</span>
-                        </div>
-                        <a href="https://www.youtube.com/watch?v={row['id']}" target="_blank" class="video-title" title="{row['title']}">
-                            {row['title']}
-                        </a>
-                        <div class="video-meta">by {row['channel']}</div>
-                        <div style="margin-top: 10px; text-align: right;">
-                             <a href="https://www.youtube.com/watch?v={row['id']}" target="_blank" style="font-size: 0.8rem; color: #FF4D4D; text-decoration: none;">
-                                Open in YouTube ↗
-                             </a>
-                        </div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+        # --- Time Budget ---
+        if st.toggle("⏱️ Fill my next N minutes", key="time_budget"):
+            render_time_budget(df, card_mode)
 
-        
-        # Navigation Controls (Bottom - for convenience)
-        st.write("---")
-        col_b_nav1, col_b_nav2, col_b_nav3 = st.columns([1, 2, 1])
-        with col_b_nav1:
-            if st.button("Previous ", key="prev_bottom", disabled=(current_page == 0)):
-                st.session_state['current_page'] -= 1
-                st.rerun()
-        with col_b_nav2:
-             st.markdown(f"<div style='text-align: center; padding-top: 10px;'>Page {current_page + 1} of {total_pages}</div>", unsafe_allow_html=True)
-        with col_b_nav3:
-            if st.button("Next ", key="next_bottom", disabled=(current_page >= total_pages - 1)):
-                st.session_state['current_page'] += 1
-                st.rerun()
+        render_results(df, order, sort_order, items_per_page, card_mode)
 
+    render_performance_panel()
@@ -0,0 +1,89 @@
+import itertools
+import random
+
+import pytest
+
+from playlist_sorter.budget import MAX_CELLS, TimeBudget
+from playlist_sorter.frames import build_frame
+
+
+def random_frame(rng, n):
+    return build_frame([
+        {'id': f'v{i}', 'title': 't', 'channel': 'c',
+         'duration_sec': rng.choice([None, 0] + list(range(30, 1200, 37))),
+         'view_count': rng.randint(0, 1000)}
+        for i in range(n)
+    ])
+
+
+def playable(df):
+    """Rows with a known, positive duration."""
+    return df.index[df['duration_sec'].fillna(0) > 0].tolist()
+
+
+def subsets(rows, df, budget):
+    """Every set of playable rows totalling at most ``budget`` seconds."""
+    seconds = df['duration_sec']
+    for k in range(len(rows) + 1):
+        for chosen in itertools.combinations(rows, k):
+            if sum(int(seconds[i]) for i in chosen) <= budget:
+                yield chosen
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_fit_and_best_set_match_brute_force(seed):
+    rng = random.Random(seed)
+    df = random_frame(rng, rng.randint(1, 10))
+    budget = rng.randint(0, MAX_CELLS)
+    rows = playable(df)
+    feasible = list(subsets(rows, df, budget))
+
+    fit = TimeBudget(df).fit(budget)
+    assert fit.count == max(len(chosen) for chosen in feasible)
+    assert fit.seconds <= budget
+
+    best = TimeBudget(df).best_set(budget, 'views')
+    assert best.value == max(sum(int(df['view_count'][i]) for i in chosen) for chosen in feasible)
+    assert best.seconds == sum(int(df['duration_sec'][i]) for i in best.positions)
+    assert best.value == sum(int(df['view_count'][i]) for i in best.positions)
+    assert best.seconds <= budget
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_position_best_set_takes_every_next_video_that_fits(seed):
+    rng = random.Random(seed)
+    df = random_frame(rng, rng.randint(1, 30))
+    budget = rng.randint(0, 5000)
+
+    expected, left = [], budget
+    for i in sorted(playable(df), key=lambda i: df['position'][i]):
+        if df['duration_sec'][i] <= left:
+            expected.append(i)
+            left -= int(df['duration_sec'][i])
+
+    best = TimeBudget(df).best_set(budget, 'position')
+    assert best.positions.tolist() == expected
+    assert best.seconds == budget - left
+
+
+def test_best_set_never_runs_over_a_large_budget():
+    # Past MAX_CELLS seconds durations are rounded up to whole cells.
+    rng = random.Random(0)
+    df = random_frame(rng, 500)
+    for budget in (MAX_CELLS + 1, 3 * MAX_CELLS + 7, 24 * 3600):
+        best = TimeBudget(df).best_set(budget, 'views')
+        assert best.seconds <= budget
+        assert len(set(best.positions.tolist())) == len(best.positions)
+
+
+def test_videos_without_a_known_duration_are_left_out():
+    df = build_frame([
+        {'id': 'live', 'title': 't', 'channel': 'c', 'duration_sec': None, 'view_count': 10**9},
+        {'id': 'zero', 'title': 't', 'channel': 'c', 'duration_sec': 0, 'view_count': 10**9},
+        {'id': 'ok', 'title': 't', 'channel': 'c', 'duration_sec': 60, 'view_count': 1},
+    ])
+    budget = TimeBudget(df)
+    assert len(budget) == 1
+    assert budget.at_most(3600).tolist() == [2]
+    assert budget.fit(3600) == (1, 60)
+    assert budget.best_set(3600).positions.tolist() == [2]
@@ -0,0 +1,25 @@
+from playlist_sorter.cache import UNKNOWN_DURATION_TTL, VideoCache
+
+DAY = 24 * 3600
+
+
+def record(video_id, duration_sec, duration_status):
+    return {'id': video_id, 'title': 't', 'channel': 'c', 'thumbnail': '',
+            'duration_sec': duration_sec, 'duration_status': duration_status, 'view_count': 1}
+
+
+def test_durations_that_were_not_known_are_fetched_again():
+    cache = VideoCache(':memory:')
+    cache.put_many([record('ok', 60, 'ok'), record('live', None, 'live'), record('bad', None, 'invalid')],
+                   now=0)
+
+    _, refresh = cache.get_many(['ok', 'live', 'bad'], now=UNKNOWN_DURATION_TTL / 2)
+    assert refresh == {}
+
+    _, refresh = cache.get_many(['ok', 'live', 'bad'], now=5 * DAY)
+    assert refresh['ok'] == ('statistics',)
+    assert refresh['live'] == refresh['bad'] == ('contentDetails', 'statistics')
+
+    # Even where stale details are acceptable.
+    _, refresh = cache.get_many(['ok', 'live'], now=5 * DAY, stale_ok=['ok', 'live'])
+    assert refresh == {'live': ('contentDetails',)}
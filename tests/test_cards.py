@@ -0,0 +1,34 @@
+from html.parser import HTMLParser
+
+import pytest
+
+from playlist_sorter.cards import card_html
+
+NASTY = '</div></a><script>alert("x")</script> & <b>'
+
+
+class TagCounter(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.depth = {}
+        self.texts = []
+
+    def handle_starttag(self, tag, attrs):
+        self.depth[tag] = self.depth.get(tag, 0) + 1
+
+    def handle_endtag(self, tag):
+        self.depth[tag] = self.depth.get(tag, 0) - 1
+
+    def handle_data(self, data):
+        self.texts.append(data)
+
+
+@pytest.mark.parametrize('facade', [True, False])
+def test_titles_and_channels_cannot_break_the_markup(facade):
+    head, tail = card_html('abcdefghijk', NASTY, NASTY, 60, 'ok', NASTY, facade)
+    parser = TagCounter()
+    parser.feed(f'{head}1{tail}')
+    parser.close()
+    assert parser.depth.get('script', 0) == 0 and 'b' not in parser.depth
+    assert parser.depth['div'] == 0 and parser.depth['a'] == 0
+    assert NASTY in ''.join(parser.texts)
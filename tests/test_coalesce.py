@@ -0,0 +1,134 @@
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+from benchmarks.fake_youtube import FakeYouTubeHttp, build_fake_client
+from playlist_sorter.cache import ALL_PARTS, VideoCache
+from playlist_sorter.coalesce import DetailCoalescer
+
+PRIVATE = 3
+
+
+class GatedHttp(FakeYouTubeHttp):
+    """Holds every ``videos.list`` call until ``release`` is set; video PRIVATE is private."""
+
+    def __init__(self, error_rate=0.0):
+        super().__init__(100, error_rate=error_rate)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.requested = []
+
+    def video_item(self, i, parts):
+        item = super().video_item(i, parts)
+        if 'status' in parts and i == PRIVATE:
+            item['status']['privacyStatus'] = 'private'
+        return item
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        if urllib.parse.urlparse(uri).path.endswith('/videos'):
+            query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(uri).query))
+            with self._lock:
+                self.requested.append(query['id'].split(','))
+            self.entered.set()
+            assert self.release.wait(5)
+        return super().request(uri, method, body, headers, **kwargs)
+
+
+@pytest.fixture
+def youtube():
+    return build_fake_client(FakeYouTubeHttp(100))
+
+
+def ids(*numbers):
+    return {f'v{i:010d}': ALL_PARTS for i in numbers}
+
+
+def start(coalescer, youtube, refresh, http):
+    """Runs ``coalescer.fetch`` on a thread; returns the thread and its result holder."""
+    result = {}
+    thread = threading.Thread(
+        target=lambda: result.update(out=coalescer.fetch(youtube, refresh, http)), daemon=True
+    )
+    thread.start()
+    return thread, result
+
+
+def test_joins_a_call_already_in_flight(youtube):
+    http = GatedHttp()
+    coalescer = DetailCoalescer(VideoCache(':memory:'), linger=0)
+    refresh = ids(0, 1, 2)
+
+    first, first_result = start(coalescer, youtube, refresh, http)
+    assert http.entered.wait(5)
+    second, second_result = start(coalescer, youtube, refresh, http)
+    http.release.set()
+    first.join(5)
+    second.join(5)
+
+    assert http.calls['videos'] == 1
+    for fetched, missing, errors in (first_result['out'], second_result['out']):
+        assert set(fetched) == set(refresh)
+        assert not missing and not errors
+
+
+def test_fills_a_batch_with_other_callers_ids(youtube):
+    http = GatedHttp()
+    http.release.set()
+    # Long enough for both callers to queue before anyone calls.
+    coalescer = DetailCoalescer(linger=5)
+    began = time.monotonic()
+    first, first_result = start(coalescer, youtube, ids(*range(50, 70)), http)
+    second, second_result = start(coalescer, youtube, ids(*range(70, 100)), http)
+    first.join(10)
+    second.join(10)
+
+    # Neither waits out the linger once the batch is full and taken.
+    assert time.monotonic() - began < 2
+    assert http.calls['videos'] == 1
+    assert len(http.requested[0]) == 50
+    assert set(first_result['out'][0]) == set(ids(*range(50, 70)))
+    assert set(second_result['out'][0]) == set(ids(*range(70, 100)))
+
+
+def test_private_videos_are_fetched_again_with_the_callers_own_client(youtube):
+    http = GatedHttp()
+    cache = VideoCache(':memory:')
+    coalescer = DetailCoalescer(cache, linger=0)
+    refresh = ids(PRIVATE, 4)
+
+    first, first_result = start(coalescer, youtube, refresh, http)
+    assert http.entered.wait(5)
+    second, second_result = start(coalescer, youtube, refresh, http)
+    http.release.set()
+    first.join(5)
+    second.join(5)
+
+    # The leader sees its own private video; the joiner asks again for it alone.
+    assert http.calls['videos'] == 2
+    assert http.requested[1] == [f'v{PRIVATE:010d}']
+    assert set(first_result['out'][0]) == set(refresh)
+    assert set(second_result['out'][0]) == set(refresh)
+    records, _ = cache.get_many(refresh)
+    assert set(records) == {'v0000000004'}
+
+
+def test_a_failed_call_is_retried_by_the_callers_that_joined_it(youtube):
+    failing = GatedHttp(error_rate=1.0)
+    working = FakeYouTubeHttp(100)
+    coalescer = DetailCoalescer(linger=0)
+    refresh = ids(0, 1)
+
+    first, first_result = start(coalescer, youtube, refresh, failing)
+    assert failing.entered.wait(5)
+    second, second_result = start(coalescer, youtube, refresh, working)
+    failing.release.set()
+    first.join(5)
+    second.join(5)
+
+    fetched, missing, errors = first_result['out']
+    assert not fetched and len(errors) == 1
+    fetched, missing, errors = second_result['out']
+    assert set(fetched) == set(refresh) and not errors
+    assert working.calls['videos'] == 1
@@ -0,0 +1,59 @@
+import pytest
+
+from benchmarks.fake_youtube import FakeYouTubeHttp, build_fake_client
+from playlist_sorter.fetch import MEMBERSHIP_SEP, fetch_combined_videos, iter_combined_videos
+
+
+class PlaylistsHttp(FakeYouTubeHttp):
+    """Playlist ``PLk`` holds videos ``30k`` to ``30k + 99``; ``PLbad`` cannot be listed."""
+
+    def __init__(self):
+        super().__init__(1000)
+
+    def _playlist_items(self, query):
+        if query['playlistId'] == 'PLbad':
+            raise ValueError('no such playlist')
+        k = int(query['playlistId'][2:])
+        start = int(query.get('pageToken') or 0)
+        stop = min(start + int(query.get('maxResults', 5)), 100)
+        body = {'items': [{'contentDetails': {'videoId': self.video_id(30 * k + i)}} for i in range(start, stop)]}
+        if stop < 100:
+            body['nextPageToken'] = str(stop)
+        return body
+
+
+def ids(numbers):
+    return [f'v{i:010d}' for i in numbers]
+
+
+@pytest.mark.parametrize('pooled', [False, True])
+def test_union_in_playlist_order_with_membership(pooled):
+    http = PlaylistsHttp()
+    videos = fetch_combined_videos(
+        build_fake_client(http), ['PL0', 'PL1', 'PL2'], labels={'PL0': 'Zero'},
+        http_factory=PlaylistsHttp if pooled else None,
+    )
+    assert [video['id'] for video in videos] == ids(range(160))
+    by_id = {video['id']: video['playlists'] for video in videos}
+    assert by_id['v0000000000'] == 'Zero'
+    assert by_id['v0000000030'] == MEMBERSHIP_SEP.join(['Zero', 'PL1'])
+    assert by_id['v0000000060'] == MEMBERSHIP_SEP.join(['Zero', 'PL1', 'PL2'])
+    assert by_id['v0000000159'] == 'PL2'
+    if not pooled:
+        # Every video fetched once, in full batches: 160 IDs need 4 calls.
+        assert http.calls['videos'] == 4
+
+
+def test_a_playlist_that_fails_to_walk_leaves_the_others():
+    errors = []
+    videos = fetch_combined_videos(build_fake_client(PlaylistsHttp()), ['PLbad', 'PL1'],
+                                   on_error=errors.append)
+    assert [video['id'] for video in videos] == ids(range(30, 130))
+    assert len(errors) == 1
+
+
+def test_stops_walking_once_asked():
+    http = PlaylistsHttp()
+    batches = iter_combined_videos(build_fake_client(http), ['PL0', 'PL1'], should_stop=lambda: True)
+    assert list(batches) == []
+    assert 'playlistItems' not in http.calls
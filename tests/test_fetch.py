@@ -0,0 +1,52 @@
+import pytest
+
+from benchmarks.fake_youtube import FakeYouTubeHttp, build_fake_client
+from playlist_sorter.cache import VideoCache
+from playlist_sorter.coalesce import DetailCoalescer
+from playlist_sorter.fetch import fetch_video_details
+
+
+class PartialHttp(FakeYouTubeHttp):
+    """Leaves statistics out for even videos and contentDetails for every third one."""
+
+    def video_item(self, i, parts):
+        item = super().video_item(i, parts)
+        if i % 2 == 0:
+            item.pop('statistics', None)
+        if i % 3 == 0:
+            item.pop('contentDetails', None)
+        return item
+
+
+class BrokenCache(VideoCache):
+    def put_many(self, records, parts=None, now=None):
+        raise OSError('disk full')
+
+
+IDS = [f'v{i:010d}' for i in range(12)]
+
+
+@pytest.mark.parametrize('coalesce', [False, True])
+def test_items_without_some_parts_still_get_every_field(coalesce):
+    youtube = build_fake_client(PartialHttp(100))
+    cache = VideoCache(':memory:')
+    errors = []
+    videos = fetch_video_details(youtube, IDS, cache=cache, on_error=errors.append,
+                                 coalescer=DetailCoalescer(cache, linger=0) if coalesce else None)
+    assert not errors
+    assert [video['id'] for video in videos] == IDS
+    assert videos[0]['view_count'] == 0 and videos[0]['duration_status'] == 'invalid'
+    assert videos[1]['view_count'] > 0 and videos[1]['duration_status'] == 'ok'
+    records, _ = cache.get_many(IDS)
+    assert len(records) == len(IDS)
+
+
+@pytest.mark.parametrize('coalesce', [False, True])
+def test_a_failed_cache_write_is_reported_and_the_details_served(coalesce):
+    youtube = build_fake_client(FakeYouTubeHttp(100))
+    cache = BrokenCache(':memory:')
+    errors = []
+    videos = fetch_video_details(youtube, IDS, cache=cache, on_error=errors.append,
+                                 coalescer=DetailCoalescer(cache, linger=0) if coalesce else None)
+    assert [video['id'] for video in videos] == IDS
+    assert [str(e) for e in errors] == ['disk full']
@@ -0,0 +1,139 @@
+import pytest
+
+from benchmarks.fake_youtube import CHANNEL_ID, FakeYouTubeHttp, build_fake_client
+from playlist_sorter.cache import VideoCache
+from playlist_sorter.sync import SnapshotStore, iter_sync_playlist, sync_playlist
+
+PLAYLIST = 'PLsync'
+
+
+class EditableHttp(FakeYouTubeHttp):
+    """Serves one playlist whose items (video numbers, in order) can be edited."""
+
+    def __init__(self, n_videos):
+        super().__init__(n_videos + 100)
+        self.items = list(range(n_videos))
+
+    def _playlists(self, query):
+        return {'items': [{'kind': 'youtube#playlist', 'id': query['id'],
+                           'contentDetails': {'itemCount': len(self.items)}}]}
+
+    def _playlist_items(self, query):
+        start = int(query.get('pageToken') or 0)
+        stop = min(start + int(query.get('maxResults', 5)), len(self.items))
+        body = {
+            'pageInfo': {'totalResults': len(self.items), 'resultsPerPage': stop - start},
+            'items': [{'contentDetails': {'videoId': self.video_id(i)}} for i in self.items[start:stop]],
+        }
+        if stop < len(self.items):
+            body['nextPageToken'] = str(stop)
+        return body
+
+    def take_calls(self):
+        calls, self.calls = self.calls, {}
+        return {endpoint: calls.get(endpoint, 0) for endpoint in ('playlists', 'playlistItems', 'videos')}
+
+
+@pytest.fixture
+def http():
+    return EditableHttp(300)
+
+
+@pytest.fixture
+def sync(http):
+    youtube = build_fake_client(http)
+    store = SnapshotStore(':memory:')
+    # Every view count is stale as soon as it is stored.
+    cache = VideoCache(':memory:', ttls={'statistics': 0})
+
+    def sync(owner=CHANNEL_ID, **kwargs):
+        return sync_playlist(youtube, PLAYLIST, store, owner, cache=cache, **kwargs)
+    sync.store = store
+    sync.youtube = youtube
+    sync.cache = cache
+    return sync
+
+
+def ids(numbers):
+    return [f'v{i:010d}' for i in numbers]
+
+
+def test_first_sync_fetches_everything(sync, http):
+    result = sync()
+    assert [video['id'] for video in result.videos] == ids(range(300))
+    assert result.added == ids(range(300)) and not result.removed and not result.unchanged
+    assert http.take_calls() == {'playlists': 1, 'playlistItems': 6, 'videos': 6}
+
+
+def test_unchanged_playlist_serves_stale_details_from_the_cache(sync, http):
+    sync()
+    http.take_calls()
+    result = sync()
+    assert result.unchanged and not result.added and not result.removed
+    assert [video['id'] for video in result.videos] == ids(range(300))
+    assert http.take_calls() == {'playlists': 1, 'playlistItems': 0, 'videos': 0}
+
+
+def test_added_items_resume_the_walk_and_only_they_are_fetched(sync, http):
+    sync()
+    http.take_calls()
+    http.items += [300, 301, 302, 303, 304]
+    result = sync()
+    assert result.added == ids(range(300, 305)) and not result.removed
+    assert [video['id'] for video in result.videos] == ids(range(305))
+    # The last stored page again, then the new one.
+    assert http.take_calls() == {'playlists': 1, 'playlistItems': 2, 'videos': 1}
+
+
+def test_items_added_at_the_top_are_found_by_walking_every_page(sync, http):
+    sync()
+    http.take_calls()
+    http.items.insert(0, 399)
+    result = sync()
+    assert result.added == ids([399]) and not result.removed
+    assert [video['id'] for video in result.videos] == ids([399] + list(range(300)))
+    assert http.take_calls() == {'playlists': 1, 'playlistItems': 1 + 7, 'videos': 1}
+
+
+def test_removed_items_are_reported_without_details_calls(sync, http):
+    sync()
+    http.take_calls()
+    http.items.remove(10)
+    http.items.remove(299)
+    result = sync()
+    assert result.removed == ids([10, 299]) and not result.added and not result.unchanged
+    assert [video['id'] for video in result.videos] == ids(i for i in range(300) if i not in (10, 299))
+    assert http.take_calls() == {'playlists': 1, 'playlistItems': 6, 'videos': 0}
+
+
+def test_full_resync_rewalks_and_refetches_stale_details(sync, http):
+    sync()
+    http.take_calls()
+    http.items += [300]
+    result = sync(full=True)
+    assert result.added == ids([300]) and not result.removed
+    assert [video['id'] for video in result.videos] == ids(range(301))
+    assert http.take_calls() == {'playlists': 1, 'playlistItems': 7, 'videos': 7}
+    # The resync is the new snapshot.
+    http.take_calls()
+    assert sync().unchanged
+    assert http.take_calls() == {'playlists': 1, 'playlistItems': 0, 'videos': 0}
+
+
+def test_snapshots_are_kept_per_owner(sync, http):
+    sync(owner='UCone')
+    http.take_calls()
+    result = sync(owner='UCtwo')
+    assert result.added == ids(range(300))
+    assert http.take_calls()['playlistItems'] == 6
+    assert sync.store.get('UCone', PLAYLIST) is not None
+
+
+def test_a_stopped_sync_leaves_the_snapshot_alone(sync, http):
+    sync()
+    before = sync.store.get(CHANNEL_ID, PLAYLIST)
+    http.items += [300]
+    batches = iter_sync_playlist(sync.youtube, PLAYLIST, sync.store, CHANNEL_ID, cache=sync.cache,
+                                 should_stop=lambda: True)
+    assert list(batches) == []
+    assert sync.store.get(CHANNEL_ID, PLAYLIST) == before
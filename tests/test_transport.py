@@ -0,0 +1,28 @@
+import socket
+import threading
+
+import pytest
+from googleapiclient.http import DEFAULT_HTTP_TIMEOUT_SEC
+
+from playlist_sorter.transport import HttpPool
+
+
+def test_connections_time_out_like_build_http():
+    assert HttpPool().acquire().timeout == DEFAULT_HTTP_TIMEOUT_SEC
+
+
+def test_a_hung_server_does_not_block_forever():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    accepted = []
+    # Accepts the connection and never answers.
+    threading.Thread(target=lambda: accepted.append(server.accept()), daemon=True).start()
+
+    http = HttpPool(timeout=0.2).acquire()
+    try:
+        with pytest.raises(TimeoutError):
+            http.request(f'http://127.0.0.1:{server.getsockname()[1]}/')
+    finally:
+        http.discard()
+        server.close()